@@ -1,14 +1,18 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Depends
 from typing import List
-import shutil
 import os
 from uuid import uuid4
 from app.core.document_processor import process_document
 from app.db.document_store import get_document_store, DocumentStore
 from app.models.document import DocumentResponse, DocumentList
+from app.utils.file_utils import write_upload_file
 
 router = APIRouter()
 
+# Create uploads directory if it doesn't exist
+UPLOAD_DIR = "uploads"
+os.makedirs(UPLOAD_DIR, exist_ok=True)
+
 @router.post("/documents/upload", response_model=DocumentResponse)
 async def upload_document(
     background_tasks: BackgroundTasks,
@@ -21,9 +25,6 @@ async def upload_document(
     # Generate a unique ID for the document
     doc_id = str(uuid4())
     
-    # Create uploads directory if it doesn't exist
-    os.makedirs("uploads", exist_ok=True)
-    
     # Get file extension
     file_ext = os.path.splitext(file.filename)[1].lower()
     
@@ -32,11 +33,10 @@ async def upload_document(
         raise HTTPException(status_code=400, detail="Unsupported file format")
     
     # Define storage path
-    file_path = f"uploads/{doc_id}{file_ext}"
+    file_path = f"{UPLOAD_DIR}/{doc_id}{file_ext}"
     
     # Save uploaded file
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await write_upload_file(file, file_path)
     
     # Store document metadata
     document = document_store.add_document(
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi.responses import StreamingResponse
 from typing import List, Optional
 from app.db.document_store import get_document_store, DocumentStore
-from app.core.rag_engine import answer_question, generate_flashcards, generate_summary
+from app.core.rag_engine import answer_question, stream_answer, generate_flashcards, generate_summary
 from app.models.question import QuestionRequest, QuestionResponse, FlashcardRequest, FlashcardResponse, SummaryRequest, SummaryResponse
 
 router = APIRouter()
@@ -33,6 +34,30 @@ async def ask_question(
         "document_id": request.document_id
     }
 
+@router.post("/questions/ask/stream")
+async def ask_question_stream(
+    request: QuestionRequest,
+    document_store: DocumentStore = Depends(get_document_store)
+):
+    """
+    Answer a question based on the uploaded documents, streaming the answer as plain text.
+    """
+    # Check if document exists
+    if request.document_id:
+        document = document_store.get_document(request.document_id)
+        if not document:
+            raise HTTPException(status_code=404, detail="Document not found")
+    
+    # Stream the answer while it is generated
+    return StreamingResponse(
+        stream_answer(
+            question=request.question,
+            document_id=request.document_id,
+            document_store=document_store
+        ),
+        media_type="text/plain; charset=utf-8"
+    )
+
 @router.post("/questions/flashcards", response_model=FlashcardResponse)
 async def create_flashcards(
     request: FlashcardRequest,
@@ -1,16 +1,21 @@
 import os
-import uuid
+import hashlib
 import pytesseract
 from PIL import Image
 import fitz  # PyMuPDF
 import re
-from typing import List, Dict, Any, Tuple, Optional
+from typing import List, Dict, Any, Tuple, Optional, AsyncIterator
 import asyncio
 import time
+import multiprocessing
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
 from app.db.document_store import DocumentStore
-from app.db.vector_store import get_vector_store
+from app.db.vector_store import get_vector_store, ENCODE_BATCH_SIZE
 from app.models.document import DocumentChunk
+from app.utils.file_utils import file_digest
+from app.utils.log_utils import logger
 
 # Configure paths for external tools if needed
 # pytesseract.pytesseract.tesseract_cmd = r'/usr/local/bin/tesseract'
@@ -19,12 +24,98 @@ from app.models.document import DocumentChunk
 MAX_PAGES_TO_PROCESS = 50  # Limit for very large documents
 CHUNK_SIZE = 2000  # Larger chunks for more context
 CHUNK_OVERLAP = 200  # Sufficient overlap to maintain context between chunks
-BATCH_SIZE = 10  # Process chunks in batches for vector store
+BATCH_SIZE = ENCODE_BATCH_SIZE  # Process chunks in batches for vector store, one encoder batch each
+MAX_CONCURRENT_BATCHES = 8  # Batches sent to the vector store at the same time
+PDF_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)  # Threads used for PDF text extraction
+OCR_WORKERS = os.cpu_count() or 1  # Processes used for OCR, each running single-threaded Tesseract
+# Use --psm 3 (fully automatic page segmentation) for better results,
+# tesserocr workers use the equivalent PSM.AUTO / OEM.DEFAULT
+OCR_CONFIG = '--psm 3 --oem 3'
+OCR_MIN_TEXT_LENGTH = 50  # PDF pages with less extracted text than this are OCRed
+OCR_DPI = 200  # Resolution PDF pages are rendered at for OCR
+# Plain text extraction without ligature/whitespace preservation: whitespace is collapsed
+# afterwards anyway, and expanded ligatures ("fi" rather than U+FB01) match search terms
+PDF_TEXT_FLAGS = fitz.TEXT_MEDIABOX_CLIP
 
-# Debug function
-def log_debug(message):
-    with open("debug.txt", "a") as f:
-        f.write(f"{message}\n")
+# Breakpoint separators for chunk_text, most preferred first. Lookaheads find
+# overlapping matches too, mirroring str.rfind.
+_BOUNDARY_PATTERNS = [
+    (separator, re.compile(f"(?={re.escape(separator)})"))
+    for separator in ('. ', '! ', '? ', '\n\n', '\n', ' ')
+]
+
+# Tesseract API handle owned by each OCR worker process, if tesserocr is available
+_tess_api = None
+
+def _init_ocr_worker():
+    """
+    Set up an OCR worker process.
+    
+    Limits Tesseract to one OpenMP thread so workers don't oversubscribe the CPU,
+    and initializes a single tesserocr API that is reused for every image the
+    worker handles. tesserocr is imported here, after OMP_THREAD_LIMIT is set,
+    so the OpenMP runtime picks the limit up when it loads.
+    """
+    global _tess_api
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        import tesserocr
+    except ImportError:
+        # Fall back to pytesseract, which runs the tesseract binary per image
+        return
+    _tess_api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.AUTO, oem=tesserocr.OEM.DEFAULT)
+
+def _ocr_image(image: Image.Image) -> str:
+    """Run Tesseract OCR on an image. Executed inside an OCR worker process."""
+    if _tess_api is not None:
+        _tess_api.SetImage(image)
+        return _tess_api.GetUTF8Text()
+    return pytesseract.image_to_string(image, config=OCR_CONFIG)
+
+def _ocr_image_file(file_path: str) -> str:
+    """Run Tesseract OCR on an image file. Executed inside an OCR worker process."""
+    with Image.open(file_path) as image:
+        return _ocr_image(image)
+
+def _ocr_pdf_page(file_path: str, page_num: int) -> str:
+    """Render a PDF page and run Tesseract OCR on it. Executed inside an OCR worker process."""
+    with fitz.open(file_path) as doc:
+        pixmap = doc[page_num].get_pixmap(dpi=OCR_DPI)
+    # get_pixmap renders RGB without alpha by default
+    image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    return _ocr_image(image)
+
+_ocr_pool = None
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Get the shared OCR process pool, creating it on first use.
+    
+    By then the server is multithreaded (the log listener, FAISS index and asyncio
+    worker threads, and possibly PyTorch's pools), and forking it could copy a lock
+    another thread holds into a worker. Workers are started from a clean forkserver
+    process instead (spawn where forkserver is unavailable), so no runtime is loaded
+    in them before _init_ocr_worker sets OMP_THREAD_LIMIT.
+    """
+    global _ocr_pool
+    if _ocr_pool is None:
+        start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _ocr_pool = ProcessPoolExecutor(
+            max_workers=OCR_WORKERS,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_ocr_worker
+        )
+    return _ocr_pool
+
+def make_chunk_id(doc_id: str, page_number: Optional[int], chunk_index: int, content: str) -> str:
+    """
+    Build a deterministic, content-addressed ID for a chunk.
+    
+    The same chunk of the same document always gets the same ID, so re-adding it
+    to the vector store can be detected and skipped.
+    """
+    key = f"{doc_id}:{page_number}:{chunk_index}:{content}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
 
 async def process_document(doc_id: str, file_path: str, document_store: DocumentStore):
     """
@@ -38,7 +129,7 @@ async def process_document(doc_id: str, file_path: str, document_store: Document
     try:
         start_time = time.time()
         print(f"Starting processing for document {doc_id}")
-        log_debug(f"Starting processing for document {doc_id}, file: {file_path}")
+        logger.debug(f"Starting processing for document {doc_id}, file: {file_path}")
         
         # Update status to processing
         document_store.update_document_status(doc_id, "processing")
@@ -46,85 +137,140 @@ async def process_document(doc_id: str, file_path: str, document_store: Document
         # Determine file type
         file_ext = os.path.splitext(file_path)[1].lower()
         
-        # Process based on file type
-        if file_ext == ".pdf":
-            chunks = await process_pdf(doc_id, file_path)
-        elif file_ext in [".png", ".jpg", ".jpeg"]:
-            chunks = await process_image(doc_id, file_path)
-        else:
+        if file_ext not in [".pdf", ".png", ".jpg", ".jpeg"]:
             error_msg = f"Unsupported file format: {file_ext}"
-            log_debug(error_msg)
+            logger.debug(error_msg)
             document_store.update_document_status(doc_id, "error", error_msg)
             return
         
-        if not chunks:
-            error_msg = "No content extracted from document"
-            log_debug(error_msg)
-            document_store.update_document_status(doc_id, "error", error_msg)
-            return
-            
-        print(f"Extracted {len(chunks)} chunks from document")
-        log_debug(f"Extracted {len(chunks)} chunks from document {doc_id}")
-        
-        # Store document chunks
-        document_chunks = []
-        for chunk in chunks:
-            chunk_id = str(uuid.uuid4())
-            doc_chunk = DocumentChunk(
-                id=chunk_id,
-                document_id=doc_id,
-                content=chunk["content"],
-                page_number=chunk.get("page_number"),
-                chunk_index=chunk.get("chunk_index", 0),
-                metadata=chunk.get("metadata", {})
-            )
-            document_chunks.append(doc_chunk)
+        # An identical file that was already processed is not extracted or OCRed again
+        digest = await asyncio.to_thread(file_digest, file_path)
+        source_id = document_store.find_document_by_digest(digest)
         
-        # Add chunks to document store
-        document_store.add_chunks(doc_id, document_chunks)
+        # Process based on file type
+        if source_id is not None:
+            logger.debug(f"Document {doc_id} is identical to document {source_id}, reusing its chunks")
+            chunk_stream = copy_chunks(doc_id, file_path, document_store.get_chunks(source_id))
+        elif file_ext == ".pdf":
+            chunk_stream = process_pdf(doc_id, file_path)
+        else:
+            chunk_stream = process_image(doc_id, file_path)
         
         # Add to vector store in batches
         vector_store = get_vector_store()
         
         print(f"Adding chunks to vector store in batches of {BATCH_SIZE}")
-        log_debug(f"Adding {len(document_chunks)} chunks to vector store in batches of {BATCH_SIZE}")
-        
-        for i in range(0, len(document_chunks), BATCH_SIZE):
-            batch = document_chunks[i:i+BATCH_SIZE]
-            success = vector_store.add_chunks([
-                {
-                    "id": chunk.id,
-                    "document_id": chunk.document_id,
-                    "content": chunk.content,
-                    "page_number": chunk.page_number,
-                    "chunk_index": chunk.chunk_index,
-                    "metadata": chunk.metadata
-                }
-                for chunk in batch
-            ])
-            
-            if not success:
-                error_msg = f"Failed to add batch {i//BATCH_SIZE + 1} to vector store"
+        logger.debug(f"Adding chunks of document {doc_id} to vector store in batches of {BATCH_SIZE}")
+        
+        # Send batches concurrently on worker threads, bounded to avoid flooding the store
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_BATCHES)
+        
+        async def add_batch(document_chunks):
+            async with semaphore:
+                # Build the payload only once the batch is about to be sent
+                payload = [
+                    {
+                        "id": chunk.id,
+                        "document_id": chunk.document_id,
+                        "content": chunk.content,
+                        "page_number": chunk.page_number,
+                        "chunk_index": chunk.chunk_index,
+                        "metadata": chunk.metadata
+                    }
+                    for chunk in document_chunks
+                ]
+                return await asyncio.to_thread(vector_store.add_chunks, payload)
+        
+        # Store chunks a batch at a time as they are extracted, so sending the first
+        # batches to the vector store overlaps with extracting the rest
+        batch_tasks = []
+        total_chunks = 0
+        
+        def submit_batch(document_chunks):
+            document_store.add_chunks(doc_id, document_chunks)
+            batch_tasks.append(asyncio.ensure_future(add_batch(document_chunks)))
+        
+        batch = []
+        seen_contents = set()  # hashes of the chunk texts already stored for this document
+        duplicate_chunks = 0
+        async for doc_chunk in chunk_stream:
+            # Repeated headers, footers and boilerplate pages produce identical chunks,
+            # which would only cost an embedding and crowd out other search results
+            content_hash = hashlib.blake2b(doc_chunk.content.encode(), digest_size=16).digest()
+            if content_hash in seen_contents:
+                duplicate_chunks += 1
+                continue
+            seen_contents.add(content_hash)
+            batch.append(doc_chunk)
+            total_chunks += 1
+            if len(batch) == BATCH_SIZE:
+                submit_batch(batch)
+                batch = []
+        if batch:
+            submit_batch(batch)
+        
+        if not total_chunks:
+            error_msg = "No content extracted from document"
+            logger.debug(error_msg)
+            document_store.update_document_status(doc_id, "error", error_msg)
+            return
+        
+        print(f"Extracted {total_chunks} chunks from document")
+        logger.debug(f"Extracted {total_chunks} chunks from document {doc_id}, skipped {duplicate_chunks} duplicates")
+        
+        results = await asyncio.gather(*batch_tasks, return_exceptions=True)
+        
+        for batch_num, result in enumerate(results, start=1):
+            if result is not True:
+                error_msg = f"Failed to add batch {batch_num} to vector store"
+                if isinstance(result, Exception):
+                    error_msg += f": {result}"
                 print(error_msg)
-                log_debug(error_msg)
+                logger.debug(error_msg)
                 # Continue processing other batches even if one fails
         
         # Update status to ready
         document_store.update_document_status(doc_id, "ready")
+        document_store.set_document_digest(doc_id, digest)
         
         end_time = time.time()
         processing_time = end_time - start_time
         print(f"Document processing completed in {processing_time:.2f} seconds")
-        log_debug(f"Document {doc_id} processing completed in {processing_time:.2f} seconds")
+        logger.debug(f"Document {doc_id} processing completed in {processing_time:.2f} seconds")
     
     except Exception as e:
         # Update status to error
         error_msg = f"Error processing document: {str(e)}"
         document_store.update_document_status(doc_id, "error", error_msg)
         print(error_msg)
-        log_debug(f"Error processing document {doc_id}: {str(e)}")
+        logger.debug(f"Error processing document {doc_id}: {str(e)}")
 
-async def process_pdf(doc_id: str, file_path: str) -> List[Dict[str, Any]]:
+async def copy_chunks(doc_id: str, file_path: str, chunks: List[DocumentChunk]) -> AsyncIterator[DocumentChunk]:
+    """
+    Copy the chunks of an already processed, identical file to a new document.
+    
+    Args:
+        doc_id: The ID of the new document
+        file_path: Path to the new document's file
+        chunks: The chunks of the existing document
+        
+    Yields:
+        Document chunks with metadata, re-keyed for doc_id
+    """
+    for chunk in chunks:
+        metadata = dict(chunk.metadata or {})
+        if "filename" in metadata:
+            metadata["filename"] = os.path.basename(file_path)
+        yield DocumentChunk(
+            id=make_chunk_id(doc_id, chunk.page_number, chunk.chunk_index, chunk.content),
+            document_id=doc_id,
+            content=chunk.content,
+            page_number=chunk.page_number,
+            chunk_index=chunk.chunk_index,
+            metadata=metadata
+        )
+
+async def process_pdf(doc_id: str, file_path: str) -> AsyncIterator[DocumentChunk]:
     """
     Process a PDF file and extract text content.
     
@@ -132,61 +278,121 @@ async def process_pdf(doc_id: str, file_path: str) -> List[Dict[str, Any]]:
         doc_id: The document ID
         file_path: Path to the PDF file
         
-    Returns:
-        List of content chunks with metadata
+    Yields:
+        Document chunks with metadata, in page order
     """
-    chunks = []
-    
     # Open the PDF
     try:
-        doc = fitz.open(file_path)
+        # Opening parses the file, so keep it off the event loop too
+        total_pages = await asyncio.to_thread(_pdf_page_count, file_path)
         
         # Limit pages for very large documents
-        total_pages = len(doc)
         pages_to_process = min(total_pages, MAX_PAGES_TO_PROCESS)
         
         if total_pages > MAX_PAGES_TO_PROCESS:
-            log_debug(f"Document {doc_id} has {total_pages} pages, processing first {MAX_PAGES_TO_PROCESS} pages only")
+            logger.debug(f"Document {doc_id} has {total_pages} pages, processing first {MAX_PAGES_TO_PROCESS} pages only")
             print(f"Document has {total_pages} pages, processing first {MAX_PAGES_TO_PROCESS} pages only")
         
-        # Process each page
-        for page_num in range(pages_to_process):
-            page = doc[page_num]
-            text = page.get_text()
+        # Extract the text of every page in parallel, then chunk serially
+        page_texts = await asyncio.to_thread(extract_pdf_pages, file_path, pages_to_process)
+        
+        # Scanned pages have little or no text layer, OCR those concurrently
+        ocr_pages = [page_num for page_num, text in page_texts if len(text.strip()) < OCR_MIN_TEXT_LENGTH]
+        ocr_texts = {}
+        if ocr_pages:
+            logger.debug(f"Document {doc_id} has {len(ocr_pages)} pages without a text layer, running OCR")
+            loop = asyncio.get_running_loop()
+            ocr_pool = get_ocr_pool()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(ocr_pool, _ocr_pdf_page, file_path, page_num) for page_num in ocr_pages),
+                return_exceptions=True
+            )
+            for page_num, result in zip(ocr_pages, results):
+                if isinstance(result, Exception):
+                    logger.debug(f"Error running OCR on page {page_num + 1} of {file_path}: {result}")
+                    continue
+                ocr_texts[page_num] = result
+        
+        for page_num, text in page_texts:
+            # Prefer the OCR text when it recovered more than the text layer had
+            ocr_text = ocr_texts.get(page_num, "")
+            used_ocr = len(ocr_text.strip()) > len(text.strip())
+            if used_ocr:
+                text = ocr_text
             
             # Skip empty pages
             if not text.strip():
                 continue
             
             # Clean the text to remove excessive whitespace
-            text = re.sub(r'\s+', ' ', text).strip()
+            text = ' '.join(text.split())
             
             # Split into chunks with optimized parameters
             text_chunks = chunk_text(text, max_chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
             
-            # Add chunks with metadata
+            # Yield chunks with metadata
             for i, chunk_content in enumerate(text_chunks):
-                chunks.append({
-                    "content": chunk_content,
-                    "page_number": page_num + 1,
-                    "chunk_index": i,
-                    "metadata": {
+                yield DocumentChunk(
+                    id=make_chunk_id(doc_id, page_num + 1, i, chunk_content),
+                    document_id=doc_id,
+                    content=chunk_content,
+                    page_number=page_num + 1,
+                    chunk_index=i,
+                    metadata={
                         "source": "pdf",
                         "page": page_num + 1,
-                        "total_pages": total_pages
+                        "total_pages": total_pages,
+                        "ocr": used_ocr
                     }
-                })
-        
-        doc.close()
-        return chunks
+                )
         
     except Exception as e:
         error_msg = f"Error processing PDF {file_path}: {e}"
         print(error_msg)
-        log_debug(error_msg)
-        return []
+        logger.debug(error_msg)
+
+def _pdf_page_count(file_path: str) -> int:
+    """Count the pages of a PDF, opened by path so MuPDF reads the saved file directly."""
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+def _extract_page_range(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of pages [start, end) from a PDF.
+    
+    Each call opens its own document handle so worker threads never share
+    MuPDF document state.
+    """
+    with fitz.open(file_path) as doc:
+        return [(page_num, doc[page_num].get_text("text", flags=PDF_TEXT_FLAGS)) for page_num in range(start, end)]
+
+def extract_pdf_pages(file_path: str, pages_to_process: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of the first pages_to_process pages of a PDF.
+    
+    PyMuPDF releases the GIL while extracting text, so the pages are split
+    into contiguous ranges and extracted on a thread pool.
+    
+    Args:
+        file_path: Path to the PDF file
+        pages_to_process: Number of pages to extract, starting from the first
+        
+    Returns:
+        List of (page_num, text) tuples ordered by page number
+    """
+    workers = min(PDF_EXTRACT_WORKERS, pages_to_process)
+    if workers <= 1:
+        return _extract_page_range(file_path, 0, pages_to_process)
+    
+    step = -(-pages_to_process // workers)  # ceil division
+    ranges = [(start, min(start + step, pages_to_process)) for start in range(0, pages_to_process, step)]
+    
+    with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+        # map() yields results in submission order, so pages stay sorted
+        results = executor.map(lambda r: _extract_page_range(file_path, *r), ranges)
+        return [page for page_range in results for page in page_range]
 
-async def process_image(doc_id: str, file_path: str) -> List[Dict[str, Any]]:
+async def process_image(doc_id: str, file_path: str) -> AsyncIterator[DocumentChunk]:
     """
     Process an image file and extract text using OCR.
     
@@ -194,56 +400,63 @@ async def process_image(doc_id: str, file_path: str) -> List[Dict[str, Any]]:
         doc_id: The document ID
         file_path: Path to the image file
         
-    Returns:
-        List of content chunks with metadata
+    Yields:
+        Document chunks with metadata
     """
-    chunks = []
-    
     try:
-        # Open the image
-        image = Image.open(file_path)
-        
-        # Extract text using Tesseract OCR with improved configuration
-        # Use --psm 3 (fully automatic page segmentation) for better results
-        text = pytesseract.image_to_string(
-            image,
-            config='--psm 3 --oem 3'
-        )
+        # Extract text with Tesseract in the OCR process pool so the event loop stays free
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(get_ocr_pool(), _ocr_image_file, file_path)
         
         # Skip empty images
         if not text.strip():
-            log_debug(f"No text extracted from image {file_path}")
-            return []
+            logger.debug(f"No text extracted from image {file_path}")
+            return
         
         # Clean the text to remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text).strip()
+        text = ' '.join(text.split())
         
         # Split into chunks with optimized parameters
         text_chunks = chunk_text(text, max_chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
         
-        # Add chunks with metadata
+        # Yield chunks with metadata
         for i, chunk_content in enumerate(text_chunks):
-            chunks.append({
-                "content": chunk_content,
-                "chunk_index": i,
-                "metadata": {
+            yield DocumentChunk(
+                id=make_chunk_id(doc_id, None, i, chunk_content),
+                document_id=doc_id,
+                content=chunk_content,
+                chunk_index=i,
+                metadata={
                     "source": "image",
                     "filename": os.path.basename(file_path)
                 }
-            })
-        
-        return chunks
+            )
         
     except Exception as e:
         error_msg = f"Error processing image {file_path}: {e}"
         print(error_msg)
-        log_debug(error_msg)
-        return []
+        logger.debug(error_msg)
+
+def _boundary_positions(text: str) -> List[Tuple[str, List[int]]]:
+    """
+    Find every candidate breakpoint in text, grouped by separator.
+    
+    Returns (separator, sorted start offsets) pairs in order of preference:
+    sentence terminators first, then paragraph breaks, newlines and spaces.
+    """
+    return [
+        (separator, [m.start() for m in pattern.finditer(text)])
+        for separator, pattern in _BOUNDARY_PATTERNS
+    ]
 
 def chunk_text(text: str, max_chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """
     Split text into overlapping chunks of approximately max_chunk_size characters.
     
+    Chunks end at the best boundary in the second half of their window. The
+    final chunk may run up to overlap characters past max_chunk_size rather
+    than leave a short tail chunk.
+    
     Args:
         text: The text to split
         max_chunk_size: Maximum chunk size in characters
@@ -256,6 +469,10 @@ def chunk_text(text: str, max_chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK
     if len(text) <= max_chunk_size:
         return [text]
     
+    # Scan the text once for all boundaries instead of calling rfind per chunk
+    boundaries = _boundary_positions(text)
+    min_fill = max_chunk_size // 2
+    
     chunks = []
     start = 0
     
@@ -268,43 +485,26 @@ def chunk_text(text: str, max_chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK
             chunks.append(text[start:])
             break
         
-        # Try to find a good sentence boundary to break on
-        # First look for periods followed by space or newline
-        breakpoint = text.rfind('. ', start, end)
-        if breakpoint == -1:
-            # Try other sentence terminators
-            breakpoint = text.rfind('! ', start, end)
-            if breakpoint == -1:
-                breakpoint = text.rfind('? ', start, end)
-                if breakpoint == -1:
-                    # Try to find paragraph breaks
-                    breakpoint = text.rfind('\n\n', start, end)
-                    if breakpoint == -1:
-                        # Try to find a newline
-                        breakpoint = text.rfind('\n', start, end)
-                        if breakpoint == -1:
-                            # Try to find a space
-                            breakpoint = text.rfind(' ', start, end)
-                            if breakpoint == -1:
-                                # No good breakpoint, just use max size
-                                breakpoint = end
-                            else:
-                                breakpoint += 1  # Include the space
-                        else:
-                            breakpoint += 1  # Include the newline
-                    else:
-                        breakpoint += 2  # Include the paragraph break
-                else:
-                    breakpoint += 2  # Include the question mark and space
-            else:
-                breakpoint += 2  # Include the exclamation mark and space
-        else:
-            breakpoint += 2  # Include the period and space
+        # Use the last boundary of the most preferred separator that fits in the window,
+        # keeping the separator at the end of the chunk. Boundaries in the first half of
+        # the window are skipped, they would make small chunks that advance by little
+        # more than the overlap.
+        breakpoint = end
+        for separator, positions in boundaries:
+            idx = bisect_right(positions, end - len(separator)) - 1
+            if idx >= 0 and positions[idx] + len(separator) >= start + min_fill:
+                breakpoint = positions[idx] + len(separator)
+                break
+        
+        if len(text) - breakpoint <= overlap:
+            # The next chunk would be little more than overlap, extend this one to the end instead
+            chunks.append(text[start:])
+            break
         
         # Add the chunk
         chunks.append(text[start:breakpoint])
         
-        # Start next chunk with overlap
-        start = max(0, breakpoint - overlap)
+        # Start next chunk with overlap, always moving forward
+        start = max(start + 1, breakpoint - overlap)
     
     return chunks
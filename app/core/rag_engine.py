@@ -1,12 +1,19 @@
 import os
-from typing import List, Dict, Any, Optional
+import asyncio
+from typing import List, Dict, Any, Optional, Tuple, AsyncIterator
+import re
 import json
 import random
+import hashlib
+from collections import OrderedDict
 from dotenv import load_dotenv
 
 from app.db.document_store import DocumentStore
 from app.db.vector_store import get_vector_store
+from app.db.response_cache import get_response_cache
 from app.models.question import Flashcard
+from app.core.semantic_cache import SemanticCache
+from app.utils.log_utils import logger
 
 # Import the correct Gemini client
 import google.generativeai as genai
@@ -21,14 +28,194 @@ if not gemini_api_key:
 # Configure the Gemini client with the API key
 genai.configure(api_key=gemini_api_key)
 
-# Debug function
-def log_debug(message):
-    with open("debug.txt", "a") as f:
-        f.write(f"{message}\n")
-
 # Set the model to the latest version
 DEFAULT_MODEL = "gemini-1.5-flash"
-log_debug(f"Using model: {DEFAULT_MODEL}")
+logger.debug(f"Using model: {DEFAULT_MODEL}")
+
+# Build the model client once and reuse it for every request
+_MODEL = genai.GenerativeModel(DEFAULT_MODEL)
+
+# Answers are grounded in the retrieved context, so keep sampling close to greedy
+# and cap their length; a shorter cap also bounds the time to a complete answer
+ANSWER_GENERATION_CONFIG = {"temperature": 0.1, "max_output_tokens": 1024}
+
+# Rough token budget for retrieved context in a prompt, estimated at ~4 characters per token
+CONTEXT_TOKEN_BUDGET = 3000
+CHARS_PER_TOKEN = 4
+
+# Search results fetched per context chunk kept, so duplicates can be dropped
+RETRIEVAL_OVERFETCH = 2
+
+# Fixed start of every question-answering prompt, kept identical across requests
+ANSWER_PROMPT_PREFIX = """
+Answer the question using only the information in the context below. If the context doesn't contain the answer, acknowledge that you don't have enough information.
+
+CONTEXT:
+"""
+
+# Matches one "Q: ... A: ..." flashcard in a Gemini response
+_FLASHCARD_RE = re.compile(r'Q:\s*(.+?)\s*A:\s*(.+?)(?=\s*Q:|\Z)', re.S)
+
+# Answers for semantically equivalent questions, keyed on the question embedding
+_answer_cache = SemanticCache(threshold=0.95)
+
+# Gemini calls currently in flight, keyed by a hash of their prompt
+_inflight_generations: Dict[str, "asyncio.Future[str]"] = {}
+
+# Recently split documents, keyed by a hash of their text
+SENTENCE_CACHE_SIZE = 128
+_sentence_cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+def split_sentences(text: str) -> tuple:
+    """
+    Split text into stripped, non-empty sentences on periods.
+    
+    Results are memoized on a BLAKE2b hash of the text, so repeated calls over
+    the same document content skip re-splitting without keeping the text alive.
+    
+    Args:
+        text: The text to split
+        
+    Returns:
+        tuple: The sentences, in order
+    """
+    key = hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+    sentences = _sentence_cache.get(key)
+    if sentences is not None:
+        _sentence_cache.move_to_end(key)
+        return sentences
+    
+    sentences = tuple(s.strip() for s in text.replace('\n', ' ').split('.') if s.strip())
+    _sentence_cache[key] = sentences
+    if len(_sentence_cache) > SENTENCE_CACHE_SIZE:
+        _sentence_cache.popitem(last=False)
+    return sentences
+
+async def _generate_text(prompt: str) -> str:
+    response = await _MODEL.generate_content_async(prompt)
+    return response.text.strip()
+
+async def generate_text_once(prompt: str) -> str:
+    """
+    Generate a response for a prompt, sharing the call with identical concurrent requests.
+    
+    Repeated clicks, or several clients asking for flashcards or a summary of the
+    same document at once, then wait on a single Gemini request.
+    
+    Args:
+        prompt: The prompt to send
+        
+    Returns:
+        str: The stripped response text
+    """
+    key = hashlib.blake2b(prompt.encode(), digest_size=16).hexdigest()
+    future = _inflight_generations.get(key)
+    if future is None:
+        future = asyncio.ensure_future(_generate_text(prompt))
+        _inflight_generations[key] = future
+        future.add_done_callback(lambda _: _inflight_generations.pop(key, None))
+    # Shield the shared call so one client disconnecting doesn't cancel it for the others
+    return await asyncio.shield(future)
+
+def fit_context_to_budget(
+    context: List[Dict[str, Any]],
+    token_budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[Dict[str, Any]]:
+    """
+    Select the best-ranked context chunks that fit within a token budget.
+    
+    Args:
+        context: Retrieved chunks, most relevant first
+        token_budget: Maximum number of (estimated) tokens to keep
+        
+    Returns:
+        The leading chunks whose combined length fits the budget. The top
+        chunk is always kept so there is something to answer from.
+    """
+    char_budget = token_budget * CHARS_PER_TOKEN
+    selected = []
+    used = 0
+    for chunk in context:
+        length = len(chunk["content"])
+        if selected and used + length > char_budget:
+            break
+        selected.append(chunk)
+        used += length
+    
+    if len(selected) < len(context):
+        logger.debug(f"Truncated context from {len(context)} to {len(selected)} chunks ({used} chars)")
+    return selected
+
+def _document_order(chunk: Dict[str, Any]) -> Tuple[str, int, int]:
+    """Sort key placing a context chunk by document, page and position within the page."""
+    metadata = chunk.get("metadata") or {}
+    page_number = metadata.get("page_number")
+    return (
+        metadata.get("document_id") or "",
+        -1 if page_number is None else page_number,
+        metadata.get("chunk_index") or 0
+    )
+
+def _page_label(chunk: Dict[str, Any]) -> str:
+    """Get the page a context chunk came from, as shown next to it in the prompt."""
+    page_number = (chunk.get("metadata") or {}).get("page_number")
+    return "" if page_number is None else f" (page {page_number})"
+
+async def _prepare_answer(
+    question: str,
+    document_id: Optional[str],
+    version: str
+) -> Tuple[Optional[str], Optional[str], List[Dict[str, Any]], Any, str]:
+    """
+    Look up a cached answer to a question, or build the prompt for a new one.
+    
+    Returns:
+        Tuple of (answer, prompt, context, query embedding, cache key). Exactly
+        one of answer and prompt is set: answer when no Gemini call is needed.
+    """
+    # Check for a cached answer to the exact same question
+    response_cache = get_response_cache()
+    cache_key = response_cache.make_key(DEFAULT_MODEL, document_id, question)
+    cached_response = await response_cache.get(cache_key, version)
+    if cached_response is not None:
+        logger.debug("Response cache hit for question")
+        return cached_response[0], None, [], None, cache_key
+    # Check for a cached answer to an equivalent question
+    query_embedding = await get_vector_store().aembed_query(question)
+    if query_embedding is not None:
+        cached = _answer_cache.get(query_embedding, document_id, version)
+        if cached is not None:
+            logger.debug("Semantic cache hit for question")
+            return cached[0], None, [], query_embedding, cache_key
+    # Get relevant context
+    context = await retrieve_context(question, document_id)
+    if not context:
+        logger.debug("No context found for question")
+        return "I couldn't find any relevant information to answer your question.", None, [], query_embedding, cache_key
+    logger.debug(f"Retrieved {len(context)} context chunks")
+    # Keep the prompt within the context budget
+    context = fit_context_to_budget(context)
+    # Format context for the prompt. Chunks are in document order so the same set of
+    # chunks always produces the same prompt prefix, and the question goes last.
+    formatted_context = "\n\n".join(
+        f"[{i}]{_page_label(chunk)} {chunk['content']}"
+        for i, chunk in enumerate(sorted(context, key=_document_order), start=1)
+    )
+    prompt = f"{ANSWER_PROMPT_PREFIX}{formatted_context}\n\nQUESTION: {question}\n"
+    return None, prompt, context, query_embedding, cache_key
+
+async def _store_answer(
+    cache_key: str,
+    query_embedding: Any,
+    document_id: Optional[str],
+    version: str,
+    answer: str,
+    context: List[Dict[str, Any]]
+):
+    """Add a newly generated answer to the response and semantic caches."""
+    await get_response_cache().put(cache_key, answer, [chunk["id"] for chunk in context], version)
+    if query_embedding is not None:
+        _answer_cache.put(query_embedding, document_id, version, (answer, context))
 
 async def answer_question(
     question: str, 
@@ -39,34 +226,61 @@ async def answer_question(
     Answer a question using RAG and Gemini.
     """
     try:
-        log_debug(f"answer_question called with question: {question}")
-        # Get relevant context
-        context = await retrieve_context(question, document_id)
-        if not context:
-            log_debug("No context found for question")
-            return "I couldn't find any relevant information to answer your question."
-        log_debug(f"Retrieved {len(context)} context chunks")
-        # Format context for the prompt
-        formatted_context = "\n\n".join([f"[{i+1}] {chunk['content']}" for i, chunk in enumerate(context)])
-        prompt = f"""
-Answer the question using only the information in the context below. If the context doesn't contain the answer, acknowledge that you don't have enough information.
-
-CONTEXT:
-{formatted_context}
-
-QUESTION: {question}
-"""
-        # Use the correct API format
-        model = genai.GenerativeModel(DEFAULT_MODEL)
-        response = model.generate_content(prompt)
+        logger.debug(f"answer_question called with question: {question}")
+        version = document_store.get_version(document_id) if document_store else ""
+        answer, prompt, context, query_embedding, cache_key = await _prepare_answer(question, document_id, version)
+        if prompt is None:
+            return answer
+        response = await _MODEL.generate_content_async(prompt, generation_config=ANSWER_GENERATION_CONFIG)
         answer = response.text.strip()
-        log_debug(f"Got Gemini response, length: {len(answer)}")
+        logger.debug(f"Got Gemini response, length: {len(answer)}")
+        await _store_answer(cache_key, query_embedding, document_id, version, answer, context)
         return answer
     except Exception as e:
-        log_debug(f"Error using Gemini for answer: {e}")
+        logger.debug(f"Error using Gemini for answer: {e}")
         print(f"Error using Gemini for answer: {e}")
         return "I encountered an error while trying to answer your question. Please try again."
 
+async def stream_answer(
+    question: str,
+    document_id: Optional[str] = None,
+    document_store: DocumentStore = None
+) -> AsyncIterator[str]:
+    """
+    Answer a question like answer_question, yielding the answer as Gemini generates it.
+    
+    Cached answers are yielded in one piece. The complete answer is cached once
+    the stream finishes.
+    """
+    answered = False
+    try:
+        logger.debug(f"stream_answer called with question: {question}")
+        version = document_store.get_version(document_id) if document_store else ""
+        answer, prompt, context, query_embedding, cache_key = await _prepare_answer(question, document_id, version)
+        if prompt is None:
+            yield answer
+            return
+        response = await _MODEL.generate_content_async(prompt, generation_config=ANSWER_GENERATION_CONFIG, stream=True)
+        parts = []
+        async for chunk in response:
+            text = chunk.text
+            if not parts:
+                # Drop the leading whitespace answer_question strips
+                text = text.lstrip()
+                if not text:
+                    continue
+            parts.append(text)
+            answered = True
+            yield text
+        answer = "".join(parts).strip()
+        logger.debug(f"Streamed Gemini response, length: {len(answer)}")
+        await _store_answer(cache_key, query_embedding, document_id, version, answer, context)
+    except Exception as e:
+        logger.debug(f"Error using Gemini for streamed answer: {e}")
+        print(f"Error using Gemini for streamed answer: {e}")
+        error_msg = "I encountered an error while trying to answer your question. Please try again."
+        yield f"\n\n{error_msg}" if answered else error_msg
+
 def simple_answering(question: str, context: List[Dict[str, Any]]) -> str:
     """
     Simple text-based answering without using an LLM.
@@ -93,7 +307,7 @@ def simple_answering(question: str, context: List[Dict[str, Any]]) -> str:
             full_text = "\n".join([chunk['content'] for chunk in context])
             
             # Split into sentences
-            sentences = [s.strip() for s in full_text.replace('\n', ' ').split('.') if s.strip()]
+            sentences = split_sentences(full_text)
             
             # Find sentences with the most question keywords
             relevant_sentences = []
@@ -116,7 +330,7 @@ def simple_answering(question: str, context: List[Dict[str, Any]]) -> str:
         return f"Based on the document, here's what I found:\n\n{most_relevant}"
     
     except Exception as e:
-        log_debug(f"Error in simple answering: {e}")
+        logger.debug(f"Error in simple answering: {e}")
         print(f"Error in simple answering: {e}")
         return "I found relevant information but couldn't formulate a concise answer. Here's the most relevant text from your document:\n\n" + context[0]['content'] if context else "No relevant information found."
 
@@ -146,24 +360,17 @@ Focus on key concepts, definitions, and important facts.
 Return only the flashcards, no explanations or extra text.
 CONTENT:\n{content}
 """
-        # Use the correct API format
-        model = genai.GenerativeModel(DEFAULT_MODEL)
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        response_text = await generate_text_once(prompt)
         # Parse flashcards from the response (expecting Q: ... A: ... format)
-        flashcards = []
-        for block in response_text.split("Q:"):
-            block = block.strip()
-            if not block:
-                continue
-            if "A:" in block:
-                q, a = block.split("A:", 1)
-                flashcards.append(Flashcard(front="Q: " + q.strip(), back="A: " + a.strip()))
+        flashcards = [
+            Flashcard(front=f"Q: {match.group(1).strip()}", back=f"A: {match.group(2).strip()}")
+            for match in _FLASHCARD_RE.finditer(response_text)
+        ]
         if not flashcards:
             raise ValueError("No flashcards parsed from Gemini response.")
         return flashcards[:count]
     except Exception as e:
-        log_debug(f"Error generating flashcards with Gemini: {e}")
+        logger.debug(f"Error generating flashcards with Gemini: {e}")
         raise RuntimeError(f"Failed to generate flashcards with Gemini: {e}")
 
 def generate_simple_flashcards(chunks: List[str], count: int = 5, topic: Optional[str] = None) -> List[Flashcard]:
@@ -184,7 +391,7 @@ def generate_simple_flashcards(chunks: List[str], count: int = 5, topic: Optiona
     full_text = " ".join(chunks)
     
     # Split into sentences
-    sentences = [s.strip() for s in full_text.replace('\n', ' ').split('.') if s.strip() and len(s.split()) > 5]
+    sentences = [s for s in split_sentences(full_text) if len(s.split()) > 5]
     
     # Filter for topic if provided
     if topic:
@@ -252,15 +459,12 @@ Focus on the main points, key concepts, and important details.
 The summary should be concise, coherent, and well-structured.
 CONTENT:\n{content}
 """
-        # Use the correct API format
-        model = genai.GenerativeModel(DEFAULT_MODEL)
-        response = model.generate_content(prompt)
-        summary = response.text.strip()
+        summary = await generate_text_once(prompt)
         if not summary:
             raise ValueError("No summary returned from Gemini.")
         return summary
     except Exception as e:
-        log_debug(f"Error generating summary with Gemini: {e}")
+        logger.debug(f"Error generating summary with Gemini: {e}")
         raise RuntimeError(f"Failed to generate summary with Gemini: {e}")
 
 def generate_simple_summary(chunks: List[str], max_length: int = 500) -> str:
@@ -279,7 +483,7 @@ def generate_simple_summary(chunks: List[str], max_length: int = 500) -> str:
         full_text = " ".join(chunks)
         
         # Split into sentences
-        sentences = [s.strip() for s in full_text.replace('\n', ' ').split('.') if s.strip()]
+        sentences = split_sentences(full_text)
         
         # Calculate how many sentences we need for the target length
         avg_words_per_sentence = sum(len(s.split()) for s in sentences) / max(1, len(sentences))
@@ -350,11 +554,23 @@ async def retrieve_context(
     # Create filter if document_id is provided
     filter_dict = {"document_id": document_id} if document_id else None
     
-    # Search for relevant chunks
-    results = vector_store.search(
+    # Search for relevant chunks, fetching extra candidates to replace duplicates
+    results = await vector_store.asearch(
         query=query,
         filter_dict=filter_dict,
-        limit=max_chunks
+        limit=max_chunks * RETRIEVAL_OVERFETCH
     )
     
-    return results
+    # Re-uploads of a file and repeated passages return identical chunks, which would
+    # only lengthen the prompt; keep the best-ranked copy of each
+    unique = []
+    seen = set()
+    for result in results:
+        if result["content"] in seen:
+            continue
+        seen.add(result["content"])
+        unique.append(result)
+        if len(unique) == max_chunks:
+            break
+    
+    return unique
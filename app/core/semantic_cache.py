@@ -0,0 +1,145 @@
+import time
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+class _CacheEntry:
+    __slots__ = ("embedding", "document_id", "version", "value", "created_at", "signatures")
+
+    def __init__(self, embedding: np.ndarray, document_id: Optional[str], version: str, value: Any, signatures: List[int]):
+        self.embedding = embedding
+        self.document_id = document_id
+        self.version = version
+        self.value = value
+        self.created_at = time.time()
+        self.signatures = signatures
+
+class SemanticCache:
+    """
+    An LRU cache keyed on query embeddings rather than exact query text.
+
+    Embeddings are bucketed with random-projection LSH so a lookup only compares
+    against entries that share a bucket, and a hit requires the cosine similarity
+    to reach the threshold. Entries are also tagged with a document version so
+    they stop matching once the underlying documents change.
+    """
+
+    def __init__(
+        self,
+        num_tables: int = 8,
+        num_bits: int = 16,
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        seed: int = 0
+    ):
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._rng = np.random.default_rng(seed)
+        self._planes: Optional[np.ndarray] = None  # (num_tables, num_bits, dim), created on first use
+        self._bit_weights = 1 << np.arange(num_bits, dtype=np.int64)
+        self._tables: List[Dict[int, Set[int]]] = [defaultdict(set) for _ in range(num_tables)]
+        self._entries: "OrderedDict[int, _CacheEntry]" = OrderedDict()
+        self._next_key = 0
+
+    def _normalize(self, embedding) -> np.ndarray:
+        vec = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def _signatures(self, vec: np.ndarray) -> List[int]:
+        """Compute one LSH bucket signature per table."""
+        if self._planes is None:
+            self._planes = self._rng.standard_normal(
+                (self.num_tables, self.num_bits, vec.shape[0])
+            ).astype(np.float32)
+        bits = (self._planes @ vec) > 0  # (num_tables, num_bits)
+        return [int(sig) for sig in bits.astype(np.int64) @ self._bit_weights]
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        for table, signature in zip(self._tables, entry.signatures):
+            bucket = table.get(signature)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del table[signature]
+
+    def get(self, embedding, document_id: Optional[str], version: str) -> Optional[Any]:
+        """
+        Look up a cached value for a semantically equivalent query.
+
+        Args:
+            embedding: The query embedding
+            document_id: The document the query was restricted to, if any
+            version: The current version of the document(s) the query covers
+
+        Returns:
+            The cached value, or None on a miss
+        """
+        if not self._entries:
+            return None
+
+        vec = self._normalize(embedding)
+        if self._planes is not None and self._planes.shape[2] != vec.shape[0]:
+            return None
+
+        candidates: Set[int] = set()
+        for table, signature in zip(self._tables, self._signatures(vec)):
+            candidates.update(table.get(signature, ()))
+
+        now = time.time()
+        best_key, best_score = None, self.threshold
+        for key in candidates:
+            entry = self._entries[key]
+            if entry.document_id != document_id:
+                continue
+            if now - entry.created_at > self.ttl_seconds or entry.version != version:
+                # Expired, or the document changed since this answer was cached
+                self._remove(key)
+                continue
+            score = float(entry.embedding @ vec)
+            if score >= best_score:
+                best_key, best_score = key, score
+
+        if best_key is None:
+            return None
+
+        self._entries.move_to_end(best_key)
+        return self._entries[best_key].value
+
+    def put(self, embedding, document_id: Optional[str], version: str, value: Any):
+        """
+        Store a value for a query embedding.
+
+        Args:
+            embedding: The query embedding
+            document_id: The document the query was restricted to, if any
+            version: The current version of the document(s) the query covers
+            value: The value to cache
+        """
+        vec = self._normalize(embedding)
+        if self._planes is not None and self._planes.shape[2] != vec.shape[0]:
+            return
+
+        signatures = self._signatures(vec)
+        key = self._next_key
+        self._next_key += 1
+
+        self._entries[key] = _CacheEntry(vec, document_id, version, value, signatures)
+        for table, signature in zip(self._tables, signatures):
+            table[signature].add(key)
+
+        # Evict least recently used entries
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self):
+        """Remove all cached entries."""
+        self._entries.clear()
+        for table in self._tables:
+            table.clear()
@@ -1,18 +1,142 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Set
+import os
+import json
+import sqlite3
 import uuid
+import itertools
 
 from app.models.document import DocumentResponse, DocumentChunk
+from app.utils.file_utils import DATA_DIR
 
 class DocumentStore:
-    def __init__(self):
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        Initialize the document store.
+        
+        Args:
+            db_path: SQLite database the documents and their chunks are written through to,
+                so they survive restarts alongside the persisted vector store. None keeps
+                everything in memory.
+        """
         self.documents: Dict[str, DocumentResponse] = {}
         self.chunks: Dict[str, List[DocumentChunk]] = {}
+        self.versions: Dict[str, int] = {}  # doc_id -> bumped on every change
+        self.version = 0  # bumped on any change to any document
+        self._epoch = uuid.uuid4().hex  # distinguishes versions of different stores, persisted with the documents
+        self._all_chunks_cache: Optional[List[DocumentChunk]] = None
+        self._dirty = True  # set whenever the chunks change
+        self.digests: Dict[str, str] = {}  # file content hash -> ID of a processed document
+        
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path is not None:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._load(db_path)
+    
+    def _load(self, db_path: str):
+        """Open the database and read the documents and chunks stored by an earlier run."""
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        # Status updates commit one at a time, WAL keeps each commit to an append without an fsync
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                id TEXT PRIMARY KEY,
+                filename TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error_message TEXT,
+                digest TEXT,
+                version INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                document_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                chunk_index INTEGER NOT NULL,
+                page_number INTEGER,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id)")
+        
+        # Versions carry on from the last run, so answers cached against them stay valid
+        meta = dict(self._db.execute("SELECT key, value FROM meta"))
+        if "epoch" in meta:
+            self._epoch = meta["epoch"]
+        else:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('epoch', ?)", (self._epoch,))
+        self.version = int(meta.get("version", 0))
+        
+        # Documents still processing when the last run stopped lost their background task
+        interrupted = [row[0] for row in self._db.execute("SELECT id FROM documents WHERE status = 'processing'")]
+        if interrupted:
+            placeholders = ", ".join("?" * len(interrupted))
+            self._db.execute(f"DELETE FROM chunks WHERE document_id IN ({placeholders})", interrupted)
+            self._db.execute(
+                f"UPDATE documents SET status = 'error', error_message = ?, version = version + 1 WHERE id IN ({placeholders})",
+                ["Processing was interrupted by a server restart, please upload the document again", *interrupted]
+            )
+            self.version += 1
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(self.version),))
+        self._db.commit()
+        
+        for id, filename, status, error_message, digest, version, created_at, updated_at in self._db.execute(
+            "SELECT id, filename, status, error_message, digest, version, created_at, updated_at FROM documents ORDER BY created_at"
+        ):
+            self.documents[id] = DocumentResponse.model_construct(
+                id=id,
+                filename=filename,
+                status=status,
+                error_message=error_message,
+                created_at=datetime.fromisoformat(created_at),
+                updated_at=datetime.fromisoformat(updated_at)
+            )
+            self.versions[id] = version
+            if digest is not None:
+                self.digests.setdefault(digest, id)
+        
+        for id, document_id, content, chunk_index, page_number, metadata in self._db.execute(
+            "SELECT id, document_id, content, chunk_index, page_number, metadata FROM chunks ORDER BY row"
+        ):
+            self.chunks.setdefault(document_id, []).append(
+                DocumentChunk(id, document_id, content, chunk_index, page_number, json.loads(metadata))
+            )
+    
+    def _save_document(self, document: DocumentResponse):
+        """Write a document's fields through to the database, if persisting. _bump_version commits."""
+        if self._db is None:
+            return
+        self._db.execute(
+            """
+            INSERT INTO documents (id, filename, status, error_message, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                status = excluded.status, error_message = excluded.error_message, updated_at = excluded.updated_at
+            """,
+            (
+                document.id, document.filename, document.status, document.error_message,
+                document.created_at.isoformat(), document.updated_at.isoformat()
+            )
+        )
+    
+    def ready_document_ids(self) -> Set[str]:
+        """Get the IDs of the documents that finished processing."""
+        return {doc_id for doc_id, document in self.documents.items() if document.status == "ready"}
     
     def add_document(self, id: str, filename: str, file_path: str) -> DocumentResponse:
         """Add a new document to the store."""
         now = datetime.now()
-        document = DocumentResponse(
+        # Every field comes from the server itself, so skip validation
+        document = DocumentResponse.model_construct(
             id=id,
             filename=filename,
             status="processing",
@@ -20,6 +144,8 @@ class DocumentStore:
             updated_at=now
         )
         self.documents[id] = document
+        self._save_document(document)
+        self._bump_version(id)
         return document
     
     def get_document(self, doc_id: str) -> Optional[DocumentResponse]:
@@ -42,27 +168,81 @@ class DocumentStore:
         if error_message:
             document.error_message = error_message
         
+        self._save_document(document)
+        self._bump_version(doc_id)
         return document
     
     def add_chunks(self, doc_id: str, chunks: List[DocumentChunk]) -> bool:
-        """Add chunks for a document."""
+        """Add chunks for a document, appending to any chunks already stored."""
         if doc_id not in self.documents:
             return False
         
-        self.chunks[doc_id] = chunks
-        self.update_document_status(doc_id, "ready")
+        self.chunks.setdefault(doc_id, []).extend(chunks)
+        self._dirty = True
+        if self._db is not None:
+            self._db.executemany(
+                "INSERT INTO chunks (id, document_id, content, chunk_index, page_number, metadata) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (chunk.id, doc_id, chunk.content, chunk.chunk_index, chunk.page_number, json.dumps(chunk.metadata))
+                    for chunk in chunks
+                ]
+            )
+        # Chunks arrive a batch at a time, the processor marks the document ready once all are stored
+        self._bump_version(doc_id)
         return True
     
     def get_chunks(self, doc_id: str) -> List[DocumentChunk]:
         """Get all chunks for a document."""
         return self.chunks.get(doc_id, [])
     
+    def set_document_digest(self, doc_id: str, digest: str):
+        """Record the content hash of a document's file once it has been processed."""
+        self.digests.setdefault(digest, doc_id)
+        if self._db is not None:
+            self._db.execute("UPDATE documents SET digest = ? WHERE id = ?", (digest, doc_id))
+            self._db.commit()
+    
+    def find_document_by_digest(self, digest: str) -> Optional[str]:
+        """Get the ID of a processed, non-empty document whose file has this content hash."""
+        doc_id = self.digests.get(digest)
+        if doc_id is None:
+            return None
+        document = self.documents.get(doc_id)
+        if document is None or document.status != "ready" or not self.chunks.get(doc_id):
+            return None
+        return doc_id
+    
+    def get_version(self, doc_id: Optional[str] = None) -> str:
+        """
+        Get the version of a document, or of the whole store if doc_id is None.
+        
+        The version changes whenever the document (or any document) changes, and
+        is unique to this store (its database, or the instance when kept in memory),
+        so it is safe to persist alongside caches.
+        """
+        if doc_id is None:
+            return f"{self._epoch}:{self.version}"
+        return f"{self._epoch}:{self.versions.get(doc_id, 0)}"
+    
+    def _bump_version(self, doc_id: str):
+        """Mark a document (and therefore the store) as changed."""
+        self.versions[doc_id] = self.versions.get(doc_id, 0) + 1
+        self.version += 1
+        if self._db is not None:
+            self._db.execute("UPDATE documents SET version = ? WHERE id = ?", (self.versions[doc_id], doc_id))
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(self.version),))
+            self._db.commit()
+    
     def get_all_chunks(self) -> List[DocumentChunk]:
-        """Get all chunks across all documents."""
-        all_chunks = []
-        for chunks in self.chunks.values():
-            all_chunks.extend(chunks)
-        return all_chunks
+        """
+        Get all chunks across all documents.
+        
+        The flattened list is cached until chunks are added, so callers must not modify it.
+        """
+        if self._dirty or self._all_chunks_cache is None:
+            self._all_chunks_cache = list(itertools.chain.from_iterable(self.chunks.values()))
+            self._dirty = False
+        return self._all_chunks_cache
 
 # Singleton instance for dependency injection
 _document_store = None
@@ -71,5 +251,5 @@ def get_document_store() -> DocumentStore:
     """Get the document store singleton instance."""
     global _document_store
     if _document_store is None:
-        _document_store = DocumentStore()
+        _document_store = DocumentStore(os.path.join(DATA_DIR, "documents.sqlite"))
     return _document_store
@@ -0,0 +1,142 @@
+import os
+import asyncio
+import hashlib
+import json
+import time
+from typing import List, Optional, Tuple
+
+import aiosqlite
+
+from app.utils.file_utils import DATA_DIR
+
+# Puts between purges of expired and excess entries; the table may exceed max_entries by this many
+PURGE_INTERVAL = 100
+
+class ResponseCache:
+    """A disk-backed cache of generated answers, stored in SQLite."""
+
+    def __init__(
+        self,
+        db_path: str = os.path.join(DATA_DIR, "response_cache.db"),
+        ttl_seconds: float = 24 * 3600,
+        max_entries: int = 10_000
+    ):
+        """Initialize the response cache. The database is opened on first use."""
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._puts_since_purge = 0
+        self._db: Optional[aiosqlite.Connection] = None
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def make_key(model: str, document_id: Optional[str], question: str) -> str:
+        """Build the cache key for a question asked against a model and document."""
+        return hashlib.blake2b(f"{model}|{document_id}|{question}".encode(), digest_size=16).hexdigest()
+
+    async def _connect(self) -> aiosqlite.Connection:
+        async with self._lock:
+            if self._db is None:
+                os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+                db = await aiosqlite.connect(self.db_path)
+                await db.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS responses (
+                        key TEXT PRIMARY KEY,
+                        answer TEXT NOT NULL,
+                        chunk_ids TEXT NOT NULL,
+                        doc_version TEXT NOT NULL,
+                        created_at REAL NOT NULL
+                    )
+                    """
+                )
+                await db.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+                await self._purge(db)
+                await db.commit()
+                self._db = db
+            return self._db
+
+    async def _purge(self, db: aiosqlite.Connection):
+        """Delete expired entries, then the oldest entries past max_entries."""
+        await db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        await db.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+            (self.max_entries,)
+        )
+
+    async def get(self, key: str, doc_version: str) -> Optional[Tuple[str, List[str]]]:
+        """
+        Get a cached answer.
+
+        Args:
+            key: The cache key from make_key
+            doc_version: The current version of the document(s) the question covers
+
+        Returns:
+            Tuple of (answer, context chunk IDs), or None on a miss
+        """
+        try:
+            db = await self._connect()
+            async with db.execute(
+                "SELECT answer, chunk_ids, doc_version, created_at FROM responses WHERE key = ?",
+                (key,)
+            ) as cursor:
+                row = await cursor.fetchone()
+
+            if row is None:
+                return None
+
+            answer, chunk_ids, cached_version, created_at = row
+            if cached_version != doc_version or time.time() - created_at > self.ttl_seconds:
+                # Stale entry, the document changed or the entry expired
+                await db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                await db.commit()
+                return None
+
+            return answer, json.loads(chunk_ids)
+
+        except Exception as e:
+            print(f"Error reading response cache: {e}")
+            return None
+
+    async def put(self, key: str, answer: str, chunk_ids: List[str], doc_version: str) -> bool:
+        """
+        Store an answer in the cache.
+
+        Args:
+            key: The cache key from make_key
+            answer: The generated answer
+            chunk_ids: IDs of the context chunks the answer was generated from
+            doc_version: The current version of the document(s) the question covers
+
+        Returns:
+            bool: Success or failure
+        """
+        try:
+            db = await self._connect()
+            await db.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, chunk_ids, doc_version, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, answer, json.dumps(chunk_ids), doc_version, time.time())
+            )
+            # Entries for superseded document versions are never read again, so bound the table
+            # here, every PURGE_INTERVAL puts rather than on each one
+            self._puts_since_purge += 1
+            if self._puts_since_purge >= PURGE_INTERVAL:
+                self._puts_since_purge = 0
+                await self._purge(db)
+            await db.commit()
+            return True
+
+        except Exception as e:
+            print(f"Error writing response cache: {e}")
+            return False
+
+# Singleton instance
+_response_cache = None
+
+def get_response_cache() -> ResponseCache:
+    """Get the response cache singleton instance."""
+    global _response_cache
+    if _response_cache is None:
+        _response_cache = ResponseCache()
+    return _response_cache
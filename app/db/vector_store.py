@@ -1,26 +1,327 @@
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
 import os
+import asyncio
+import re
 import json
+import sqlite3
+import hashlib
+import sys
+import time
+import atexit
+import threading
+import importlib.util
 import numpy as np
-from collections import defaultdict
-import inspect
+from collections import OrderedDict, defaultdict
 
-# Helper function to log debug messages
-def log_debug(message):
-    with open("debug.txt", "a") as f:
-        f.write(f"{message}\n")
+from app.utils.log_utils import logger
+from app.utils.file_utils import DATA_DIR
+from app.db.document_store import get_document_store
+
+try:
+    import re2  # google-re2, a linear-time DFA matcher
+except ImportError:
+    re2 = None
+
+# Tokenizer shared by indexing and querying: runs of Unicode letters, digits and underscores,
+# so accented, Greek and CJK words are terms too. RE2's \w is ASCII-only, spell it out there
+_TOKEN_RE = re2.compile(r"[\pL\pN_]+") if re2 is not None else re.compile(r"\w+")
+
+# Per-chunk Bloom filter over its terms: BLOOM_WORDS 64-bit words, BLOOM_HASHES bits per term
+BLOOM_WORDS = 4
+BLOOM_HASHES = 2
+
+# Sentence-transformers model used for all embeddings, and texts per forward pass when embedding chunks.
+# Set EMBEDDING_MODEL to use another model; a "model2vec:" prefix (e.g. model2vec:minishlab/potion-base-8M)
+# selects static model2vec embeddings, which replace the transformer forward pass with a token
+# embedding lookup and mean, and are far faster on CPU
+DEFAULT_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+STATIC_MODEL_PREFIX = "model2vec:"
+ENCODE_BATCH_SIZE = 64
+
+# Set EMBEDDING_INT8=1 to run the encoder's linear layers in int8 on CPU (faster, slightly less exact)
+EMBEDDING_INT8 = os.environ.get("EMBEDDING_INT8", "0") == "1"
+# Set EMBEDDING_COMPILE=1 to compile the encoder with torch.compile when it is loaded
+# (slower startup, faster encoding for long-running servers)
+EMBEDDING_COMPILE = os.environ.get("EMBEDDING_COMPILE", "0") == "1"
+
+# Set EMBEDDING_THREADS to cap the CPU threads PyTorch uses to encode, e.g. so embedding
+# leaves cores free for the OCR workers; by default PyTorch uses one per physical core
+EMBEDDING_THREADS = int(os.environ.get("EMBEDDING_THREADS", "0"))
+
+# Vector store backend: "embeddings" for EmbeddingVectorStore, or "chroma" to store chunks in
+# ChromaDB instead (requires chromadb, which is not installed by default)
+VECTOR_STORE = os.environ.get("VECTOR_STORE", "embeddings").lower()
+
+# Entries kept in the query embedding and search result LRU caches
+QUERY_CACHE_SIZE = 1024
+
+# Rows of the int8 embedding matrix scored per block, so each dequantized block stays in cache
+SCORE_BLOCK_ROWS = 4096
+
+# Unfiltered CPU searches switch from exact scoring to a FAISS HNSW graph (if faiss is
+# installed) once the store holds this many chunks; below it exact search is fast enough
+HNSW_MIN_ROWS = 20_000
+
+# Past this many chunks the approximate index switches from HNSW over fp16 copies to an
+# IVF-PQ index, which compresses each embedding to dim / 8 bytes
+PQ_MIN_ROWS = 500_000
+# Candidates fetched from the PQ index per requested result, re-scored exactly in int8
+PQ_RERANK_FACTOR = 8
+
+# Minimum seconds between saves of a persisted FAISS index; each save rewrites the whole
+# file, so rows added in between are only written by a later save (or at exit)
+ANN_SAVE_INTERVAL = 30
+# Rows the background thread adds to the FAISS index per step; searches score exactly
+# while a step holds the index, so this bounds how long they go without it
+ANN_ADD_BATCH_ROWS = 16_384
+
+def ivfpq_params(num_vectors: int, dim: int) -> Tuple[int, int, int]:
+    """
+    Pick IVF-PQ parameters for an index of num_vectors vectors with dim dimensions.
+    
+    Returns:
+        Tuple of (nlist, M, nprobe): inverted lists, sub-quantizers of 8 bits each,
+        and lists scanned per query
+    """
+    nlist = int(4 * np.sqrt(num_vectors))
+    # One byte per 8 dimensions, rounded down to a divisor of dim
+    m = next(m for m in range(max(1, dim // 8), 0, -1) if dim % m == 0)
+    return nlist, m, max(16, nlist // 64)
+
+def hnsw_params(num_vectors: int) -> Tuple[int, int, int]:
+    """
+    Pick HNSW parameters for an index of num_vectors vectors.
+    
+    Returns:
+        Tuple of (M, efConstruction, efSearch)
+    """
+    if num_vectors < 100_000:
+        return 16, 128, 64
+    if num_vectors < 1_000_000:
+        return 24, 128, 100
+    return 32, 200, 128
+
+def select_torch_device():
+    """
+    Pick the accelerator to run similarity search on.
+    
+    Returns:
+        A CUDA or MPS torch.device, or None when PyTorch or an accelerator is unavailable
+    """
+    if importlib.util.find_spec("torch") is None:
+        return None
+    import torch
+    if torch.cuda.is_available():
+        return torch.device("cuda")
+    mps = getattr(torch.backends, "mps", None)
+    if mps is not None and mps.is_available():
+        return torch.device("mps")
+    return None
+
+def _content_key(content: str) -> bytes:
+    """Hash a chunk's text, identifying chunks whose embeddings are interchangeable."""
+    return hashlib.blake2b(content.encode(), digest_size=16).digest()
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetrically quantize each row of a float matrix to int8.
+    
+    Returns:
+        Tuple of (int8 matrix, float32 per-row dequantization scales)
+    """
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    max_abs = np.abs(vectors).max(axis=1)
+    max_abs[max_abs == 0] = 1.0
+    quantized = np.round(vectors * (127.0 / max_abs)[:, None]).astype(np.int8)
+    return quantized, (max_abs / 127.0).astype(np.float32)
+
+class ChunkMetadata:
+    """
+    Column-oriented chunk metadata, one entry per store row.
+    
+    The fields every chunk has live in int32 arrays, document IDs are stored once
+    and referenced by code, and the remaining per-chunk metadata has its strings
+    interned, so a large corpus does not hold a full dict with its own copies of
+    the same keys and values for every chunk.
+    """
+    
+    def __init__(self):
+        self.doc_codes: Dict[str, int] = {}  # document_id -> code
+        self.doc_names: List[str] = []  # code -> document_id
+        self.doc_code = np.empty(0, dtype=np.int32)  # row -> document code
+        self.page_number = np.empty(0, dtype=np.int32)  # row -> page number, -1 if none
+        self.chunk_index = np.empty(0, dtype=np.int32)  # row -> chunk index
+        self.extra: List[Dict[str, Any]] = []  # row -> remaining metadata
+        self.doc_rows: List[List[int]] = []  # document code -> its rows, ascending
+        self._doc_row_arrays: Dict[int, np.ndarray] = {}  # document code -> doc_rows as int32 array
+    
+    def append(self, document_id: str, page_number: Optional[int], chunk_index: int, extra: Dict[str, Any]):
+        """Add the metadata of the next row."""
+        row = len(self.extra)
+        if row >= len(self.doc_code):
+            capacity = max(64, 2 * len(self.doc_code))
+            for name in ("doc_code", "page_number", "chunk_index"):
+                grown = np.empty(capacity, dtype=np.int32)
+                grown[:row] = getattr(self, name)[:row]
+                setattr(self, name, grown)
+        
+        code = self.doc_codes.get(document_id)
+        if code is None:
+            code = len(self.doc_names)
+            document_id = sys.intern(document_id)
+            self.doc_names.append(document_id)
+            self.doc_rows.append([])
+            self.doc_codes[document_id] = code
+        
+        self.doc_code[row] = code
+        self.page_number[row] = -1 if page_number is None else page_number
+        self.chunk_index[row] = chunk_index
+        self.doc_rows[code].append(row)
+        self.extra.append({
+            sys.intern(key): sys.intern(value) if isinstance(value, str) else value
+            for key, value in extra.items()
+        })
+    
+    def get(self, row: int) -> Dict[str, Any]:
+        """Build the metadata dict of a row."""
+        page_number = int(self.page_number[row])
+        return {
+            "document_id": self.doc_names[self.doc_code[row]],
+            "page_number": None if page_number < 0 else page_number,
+            "chunk_index": int(self.chunk_index[row]),
+            **self.extra[row]
+        }
+    
+    def rows_of(self, doc_id: str, num_rows: int) -> np.ndarray:
+        """Get the rows below num_rows holding chunks of one document, as a sorted int32 array."""
+        code = self.doc_codes.get(doc_id)
+        if code is None:
+            return np.empty(0, dtype=np.int32)
+        rows = self.doc_rows[code]
+        array = self._doc_row_arrays.get(code)
+        if array is None or len(array) != len(rows):
+            array = np.asarray(rows, dtype=np.int32)
+            self._doc_row_arrays[code] = array
+        return array[:np.searchsorted(array, num_rows)]
+
+def is_static_model(model_name: str) -> bool:
+    """Whether a model name refers to a model2vec static embedding model."""
+    return model_name.startswith(STATIC_MODEL_PREFIX)
+
+def check_embedding_backend(model_name: str):
+    """Raise ImportError if the package needed to run a model is not installed."""
+    package, requirement = ("model2vec", "model2vec") if is_static_model(model_name) else ("sentence_transformers", "sentence-transformers")
+    if importlib.util.find_spec(package) is None:
+        raise ImportError(f"{requirement} is not installed")
+
+# Loaded SentenceTransformer models, shared by every store in the process
+_sentence_transformers: Dict[str, Any] = {}
+_sentence_transformers_lock = threading.Lock()
+
+def _compile_sentence_transformer(model, model_name: str):
+    """
+    Compile the transformer of a SentenceTransformer with torch.compile.
+    
+    Shapes are kept dynamic since batch sizes and sequence lengths vary between
+    calls. A warm-up encode triggers compilation at load time rather than on the
+    first request; if compiling fails the model keeps running eagerly.
+    """
+    import torch
+    transformer = model[0]
+    eager_model = transformer.auto_model
+    try:
+        transformer.auto_model = torch.compile(eager_model, dynamic=True)
+        model.encode(["warmup"] * 2, batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False)
+        logger.debug(f"Compiled SentenceTransformer {model_name} with torch.compile")
+    except Exception as e:
+        transformer.auto_model = eager_model
+        print(f"Error compiling SentenceTransformer {model_name}, running it eagerly: {e}")
+
+def get_sentence_transformer(model_name: str = EMBEDDING_MODEL):
+    """
+    Get the SentenceTransformer for a model, loading it only once per process.
+    
+    Loading reads the weights from disk and initializes the tokenizer, which takes
+    seconds, so every store and embedding function shares one instance.
+    On CUDA the weights are converted to fp16; embeddings are still returned
+    as float32 by encode_texts. Static model names load a model2vec StaticModel.
+    """
+    model = _sentence_transformers.get(model_name)
+    if model is None:
+        with _sentence_transformers_lock:
+            model = _sentence_transformers.get(model_name)
+            if model is None and is_static_model(model_name):
+                from model2vec import StaticModel
+                model = StaticModel.from_pretrained(model_name[len(STATIC_MODEL_PREFIX):])
+                _sentence_transformers[model_name] = model
+                logger.debug(f"Loaded static embedding model {model_name}")
+            elif model is None:
+                from sentence_transformers import SentenceTransformer
+                if EMBEDDING_THREADS > 0:
+                    import torch
+                    torch.set_num_threads(EMBEDDING_THREADS)
+                model = SentenceTransformer(model_name)
+                if EMBEDDING_INT8 and model.device.type == "cpu":
+                    # Dynamic quantization: int8 weights, activations quantized per batch
+                    import torch
+                    torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+                    logger.debug(f"Quantized SentenceTransformer {model_name} to int8")
+                elif model.device.type == "cuda":
+                    # MiniLM is tiny, on a GPU it is bound by memory bandwidth, which fp16 halves
+                    model.half()
+                    logger.debug(f"Converted SentenceTransformer {model_name} to fp16")
+                if EMBEDDING_COMPILE:
+                    _compile_sentence_transformer(model, model_name)
+                _sentence_transformers[model_name] = model
+                logger.debug(f"Loaded SentenceTransformer {model_name}")
+    return model
+
+def encode_texts(texts: List[str], model_name: str = EMBEDDING_MODEL) -> np.ndarray:
+    """Encode texts into L2-normalized float32 embeddings with the shared model."""
+    if is_static_model(model_name):
+        embeddings = np.asarray(get_sentence_transformer(model_name).encode(texts, show_progress_bar=False), dtype=np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return np.divide(embeddings, norms, out=np.zeros_like(embeddings), where=norms > 0)
+    model = get_sentence_transformer(model_name)
+    import torch
+    # encode only disables gradients; inference mode also skips autograd's version tracking
+    with torch.inference_mode():
+        embeddings = model.encode(
+            texts,
+            batch_size=ENCODE_BATCH_SIZE,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+    return np.asarray(embeddings, dtype=np.float32)
+
+class SharedEmbeddingFunction:
+    """A ChromaDB embedding function that encodes with the process-wide SentenceTransformer."""
+    
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        check_embedding_backend(model_name)
+        self.model_name = model_name
+        get_sentence_transformer(model_name)
+    
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return encode_texts(list(input), self.model_name).tolist()
 
 # Add simple vector store implementation that doesn't require external dependencies
 class SimpleDictVectorStore:
-    """A lightweight vector store implementation using dictionaries and basic cosine similarity."""
+    """A lightweight vector store implementation using an inverted index and keyword-overlap scoring."""
     
     def __init__(self):
         """Initialize the simple vector store."""
         self.documents = {}  # id -> document text
-        self.metadatas = {}  # id -> metadata dict
-        self.document_ids = defaultdict(list)  # document_id -> list of chunk ids
+        self.metadata = ChunkMetadata()  # row index -> chunk metadata
+        self.chunk_ids: List[str] = []  # row index -> chunk id
+        self.chunk_rows: Dict[str, int] = {}  # chunk id -> row index
+        self.postings: Dict[str, List[int]] = defaultdict(list)  # term -> sorted row indices
+        self._posting_arrays: Dict[str, np.ndarray] = {}  # term -> postings as int32 array
+        self.blooms = np.zeros((0, BLOOM_WORDS), dtype=np.uint64)  # row index -> Bloom filter of its terms
+        self._term_blooms: Dict[str, int] = {}  # term -> its Bloom bits as an int
+        self._write_lock = threading.Lock()  # batches may be added from several threads
         print("Using SimpleDictVectorStore - lightweight in-memory vector store")
     
     def add_chunks(self, chunks: List[Dict[str, Any]]) -> bool:
@@ -34,16 +335,34 @@ class SimpleDictVectorStore:
             bool: Success or failure
         """
         try:
-            for chunk in chunks:
-                chunk_id = chunk["id"]
-                self.documents[chunk_id] = chunk["content"]
-                self.metadatas[chunk_id] = {
-                    "document_id": chunk["document_id"],
-                    "page_number": chunk.get("page_number"),
-                    "chunk_index": chunk.get("chunk_index", 0),
-                    **chunk.get("metadata", {})
-                }
-                self.document_ids[chunk["document_id"]].append(chunk_id)
+            with self._write_lock:
+                for chunk in chunks:
+                    chunk_id = chunk["id"]
+                    # Chunk IDs are content-addressed, so a known ID is already stored
+                    if chunk_id in self.documents:
+                        continue
+                    self.documents[chunk_id] = chunk["content"]
+                    self.metadata.append(
+                        chunk["document_id"],
+                        chunk.get("page_number"),
+                        chunk.get("chunk_index", 0),
+                        chunk.get("metadata", {})
+                    )
+                    
+                    # Index the chunk's terms once, at insert time
+                    row = len(self.chunk_ids)
+                    self.chunk_rows[chunk_id] = row
+                    bloom = 0
+                    for term in set(_TOKEN_RE.findall(chunk["content"].lower())):
+                        self.postings[term].append(row)
+                        bloom |= self._term_bloom(term)
+                    if row >= len(self.blooms):
+                        grown = np.zeros((max(64, 2 * len(self.blooms)), BLOOM_WORDS), dtype=np.uint64)
+                        grown[:row] = self.blooms[:row]
+                        self.blooms = grown
+                    self.blooms[row] = self._bloom_words(bloom)
+                    # Publish the row last so concurrent searches only see complete rows
+                    self.chunk_ids.append(chunk_id)
             
             return True
             
@@ -51,6 +370,51 @@ class SimpleDictVectorStore:
             print(f"Error adding chunks to simple vector store: {e}")
             return False
     
+    def _term_bloom(self, term: str) -> int:
+        """Get the Bloom filter bits of a term, using double hashing of a stable digest."""
+        bits = self._term_blooms.get(term)
+        if bits is None:
+            digest = int.from_bytes(hashlib.blake2b(term.encode(), digest_size=8).digest(), "little")
+            h1, h2 = digest & 0xFFFFFFFF, (digest >> 32) | 1
+            bits = 0
+            for i in range(BLOOM_HASHES):
+                bits |= 1 << ((h1 + i * h2) % (64 * BLOOM_WORDS))
+            self._term_blooms[term] = bits
+        return bits
+    
+    @staticmethod
+    def _bloom_words(bits: int) -> np.ndarray:
+        """Split Bloom filter bits into BLOOM_WORDS uint64 words."""
+        return np.array([(bits >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(BLOOM_WORDS)], dtype=np.uint64)
+    
+    def _filtered_counts(self, terms: List[str], candidates: np.ndarray, num_rows: int) -> np.ndarray:
+        """
+        Count matching query terms for a small set of candidate rows.
+        
+        Each term's Bloom bits reject most candidates with one vectorized AND, and only
+        the rows that may contain the term are confirmed against its sorted postings.
+        """
+        counts = np.zeros(num_rows, dtype=np.int64)
+        blooms = self.blooms[candidates]
+        for term in terms:
+            words = self._bloom_words(self._term_bloom(term))
+            maybe = candidates[((blooms & words) == words).all(axis=1)]
+            if not len(maybe):
+                continue
+            postings = self._posting_array(term)
+            positions = np.minimum(np.searchsorted(postings, maybe), len(postings) - 1)
+            counts[maybe[postings[positions] == maybe]] += 1
+        return counts
+    
+    def _posting_array(self, term: str) -> np.ndarray:
+        """Get the postings for a term as an int32 array, reconverting when the term gains rows."""
+        postings = self.postings[term]
+        array = self._posting_arrays.get(term)
+        if array is None or len(array) != len(postings):
+            array = np.asarray(postings, dtype=np.int32)
+            self._posting_arrays[term] = array
+        return array
+    
     def search(self, query: str, filter_dict: Optional[Dict[str, Any]] = None, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Search for relevant document chunks using basic keyword matching.
@@ -64,41 +428,48 @@ class SimpleDictVectorStore:
             List of relevant chunks with metadata
         """
         try:
-            results = []
+            num_rows = len(self.chunk_ids)
+            query_terms = set(_TOKEN_RE.findall(query.lower()))
+            if not query_terms or not num_rows or limit <= 0:
+                return []
+            
+            # Count matching query terms per chunk from the postings of each term
+            terms = [term for term in query_terms if term in self.postings]
+            if not terms:
+                return []
+            postings = [self._posting_array(term) for term in terms]
             
             # Filter chunks by document_id if specified
-            chunk_ids = []
             if filter_dict and "document_id" in filter_dict:
-                doc_id = filter_dict["document_id"]
-                chunk_ids = self.document_ids.get(doc_id, [])
+                candidates = self.metadata.rows_of(filter_dict["document_id"], num_rows)
+                if len(candidates) < sum(len(p) for p in postings):
+                    # The document is small next to the postings, so test its rows directly
+                    counts = self._filtered_counts(terms, candidates, num_rows)
+                else:
+                    all_counts = np.bincount(np.concatenate(postings), minlength=num_rows)[:num_rows]
+                    counts = np.zeros_like(all_counts)
+                    counts[candidates] = all_counts[candidates]
             else:
-                chunk_ids = list(self.documents.keys())
-            
-            # Simple keyword search
-            query_terms = set(query.lower().split())
-            
-            scored_results = []
-            for chunk_id in chunk_ids:
-                document = self.documents[chunk_id]
-                doc_terms = set(document.lower().split())
-                
-                # Calculate a simple relevance score (% of query terms in document)
-                matching_terms = query_terms.intersection(doc_terms)
-                if matching_terms:
-                    score = len(matching_terms) / len(query_terms)
-                    scored_results.append((chunk_id, score))
-            
-            # Sort by score (highest first) and limit results
-            scored_results.sort(key=lambda x: x[1], reverse=True)
-            top_results = scored_results[:limit]
+                counts = np.bincount(np.concatenate(postings), minlength=num_rows)[:num_rows]
+            
+            # Keep the top results, ties broken by insertion order
+            rows = np.flatnonzero(counts)
+            if len(rows) > limit:
+                kth = np.partition(counts[rows], len(rows) - limit)[len(rows) - limit]
+                rows = rows[counts[rows] >= kth]
+            rows = rows[np.lexsort((rows, -counts[rows]))][:limit]
             
             # Format results
-            for chunk_id, score in top_results:
+            results = []
+            for row in rows:
+                chunk_id = self.chunk_ids[row]
+                # Relevance score is the fraction of query terms found in the chunk
+                score = counts[row] / len(query_terms)
                 results.append({
                     "content": self.documents[chunk_id],
-                    "metadata": self.metadatas[chunk_id],
+                    "metadata": self.metadata.get(row),
                     "id": chunk_id,
-                    "distance": 1.0 - score  # Convert score to distance (lower is better)
+                    "distance": 1.0 - float(score)  # Convert score to distance (lower is better)
                 })
             
             return results
@@ -107,59 +478,742 @@ class SimpleDictVectorStore:
             print(f"Error searching simple vector store: {e}")
             return []
 
-class VectorStore:
-    def __init__(self, persist_directory: str = "chroma_db"):
-        """Initialize the vector store."""
-        # Create directory if it doesn't exist
-        os.makedirs(persist_directory, exist_ok=True)
+class EmbeddingVectorStore:
+    """An in-memory vector store that ranks chunks by cosine similarity of sentence embeddings."""
+    
+    def __init__(self, model_name: str = EMBEDDING_MODEL, persist_directory: Optional[str] = None):
+        """
+        Initialize the embedding vector store.
         
-        # First try to use the simple dict-based vector store
-        try:
-            self.use_simple_store = True
-            self._impl = SimpleDictVectorStore()
-            print("Using SimpleDictVectorStore for vector storage")
-            log_debug("Initialized SimpleDictVectorStore")
+        The encoder itself is loaded on first use, but sentence-transformers must be
+        installed or an ImportError is raised so callers can fall back.
+        
+        Args:
+            model_name: The sentence-transformers model to embed with
+            persist_directory: Where to keep the embedding matrix and chunk metadata across
+                restarts. The matrix is memory-mapped, so it is paged in on demand and shared
+                between processes through the page cache. None keeps everything in memory.
+        """
+        check_embedding_backend(model_name)
+        
+        self.model_name = model_name
+        self.documents = {}  # id -> document text
+        self.metadata = ChunkMetadata()  # row index -> chunk metadata
+        self.chunk_ids: List[str] = []  # row index -> chunk id
+        self.chunk_rows: Dict[str, int] = {}  # chunk id -> row index
+        self.content_rows: Dict[bytes, int] = {}  # hash of chunk text -> first row embedding it
+        self.emb_i8 = np.empty((0, 0), dtype=np.int8)  # int8-quantized normalized embeddings, one row per chunk
+        self.scales = np.empty(0, dtype=np.float32)  # per-row dequantization scale for self.emb_i8
+        self.n = 0  # number of filled rows in self.emb_i8
+        self._write_lock = threading.Lock()  # batches may be added from several threads
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()  # normalized query -> embedding
+        self._result_cache: "OrderedDict[tuple, List[Dict[str, Any]]]" = OrderedDict()  # search key -> results
+        self._cache_lock = threading.Lock()
+        
+        # On a GPU the embeddings are kept on the device in fp16 and searched there instead
+        self.device = select_torch_device()
+        self.emb_t = None  # (capacity, dim) float16 tensor on self.device
+        if self.device is not None:
+            logger.debug(f"EmbeddingVectorStore searching on {self.device}")
+        
+        # Approximate index for large unfiltered CPU searches, kept up to date by a background thread
+        self._use_faiss = importlib.util.find_spec("faiss") is not None and self.device is None
+        self._ann = None  # FAISS HNSW or IVF-PQ index
+        self._ann_pq = False  # whether self._ann is the IVF-PQ index
+        self._ann_rows = 0  # rows added to self._ann so far
+        self._ann_lock = threading.Lock()  # held to search, extend or save self._ann
+        self._ann_path: Optional[str] = None  # where self._ann is saved when persisting
+        self._ann_mapped = False  # self._ann is a read-only memory map of the saved index
+        self._ann_dirty = False  # self._ann has rows that are not saved yet
+        self._ann_saved_at = float("-inf")  # time.monotonic() of the last save
+        self._ann_generation = 0  # bumped when rows are renumbered, invalidating indexes being built
+        self._ann_update = threading.Event()  # set to wake the background thread
+        if self._use_faiss:
+            threading.Thread(target=self._ann_worker, name="ann-index", daemon=True).start()
+        
+        self.persist_directory = persist_directory
+        self._db: Optional[sqlite3.Connection] = None
+        if persist_directory is not None:
+            os.makedirs(persist_directory, exist_ok=True)
+            self._emb_path = os.path.join(persist_directory, "emb.npy")
+            self._scales_path = os.path.join(persist_directory, "scales.npy")
+            self._ann_path = os.path.join(persist_directory, "ann.faiss")
+            atexit.register(self.flush_ann_index)
+            self._load()
+        print("Using EmbeddingVectorStore - in-memory cosine similarity search")
+    
+    def _load(self):
+        """Open the metadata database and map any embeddings persisted by an earlier run."""
+        self._db = sqlite3.connect(os.path.join(self.persist_directory, "metadata.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                document_id TEXT NOT NULL,
+                content TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS chunks_document_id ON chunks (document_id)")
+        
+        stored_model = self._db.execute("SELECT value FROM meta WHERE key = 'model_name'").fetchone()
+        if stored_model is not None and stored_model[0] != self.model_name:
+            # Embeddings from another model are not comparable, start over
+            logger.debug(f"Discarding embeddings persisted for {stored_model[0]}")
+            self._db.execute("DELETE FROM chunks")
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('model_name', ?)", (self.model_name,))
+        self._db.commit()
+        
+        rows = self._db.execute("SELECT row, id, document_id, content, metadata FROM chunks ORDER BY row").fetchall()
+        if not rows or not os.path.exists(self._emb_path) or not os.path.exists(self._scales_path):
+            self._db.execute("DELETE FROM chunks")
+            self._db.commit()
+            # An index saved for the discarded rows would point at the wrong embeddings
+            if os.path.exists(self._ann_path):
+                os.remove(self._ann_path)
             return
-        except Exception as e:
-            print(f"Failed to initialize simple vector store: {e}")
-            self.use_simple_store = False
         
-        # Try to initialize ChromaDB client
+        # Rows are recorded only after their embeddings are flushed, so every row is in the matrix
+        self.emb_i8 = np.load(self._emb_path, mmap_mode="r+")
+        self.scales = np.load(self._scales_path, mmap_mode="r+")
+        if rows[-1][0] >= self.emb_i8.shape[0]:
+            # Rows past the end of the matrix have no embedding to pair with
+            self._db.execute("DELETE FROM chunks WHERE row >= ?", (self.emb_i8.shape[0],))
+            self._db.commit()
+            rows = [row for row in rows if row[0] < self.emb_i8.shape[0]]
+        chunks = []
+        for _, chunk_id, document_id, content, metadata in rows:
+            extra = json.loads(metadata)
+            extra.pop("document_id", None)  # written into the JSON by earlier versions
+            chunks.append({
+                "id": chunk_id,
+                "document_id": document_id,
+                "content": content,
+                "page_number": extra.pop("page_number", None),
+                "chunk_index": extra.pop("chunk_index", 0),
+                "metadata": extra
+            })
+        
+        positions = np.asarray([row[0] for row in rows], dtype=np.int64)
+        if not np.array_equal(positions, np.arange(len(rows))):
+            # Stored rows don't line up with the matrix (a gap left by a failed write),
+            # rewrite them contiguously with the embeddings they were stored with
+            logger.debug(f"Compacting {len(rows)} persisted rows with gaps in {self.persist_directory}")
+            self._replace_rows(chunks, self.emb_i8[positions], self.scales[positions])
+            return
+        
+        for row, chunk in enumerate(chunks):
+            self.documents[chunk["id"]] = chunk["content"]
+            self.metadata.append(chunk["document_id"], chunk["page_number"], chunk["chunk_index"], chunk["metadata"])
+            self.chunk_rows[chunk["id"]] = row
+            self.chunk_ids.append(chunk["id"])
+            self.content_rows.setdefault(_content_key(chunk["content"]), row)
+        self.n = len(rows)
+        
+        if self.device is not None:
+            import torch
+            vectors = self.emb_i8[:self.n].astype(np.float32) * self.scales[:self.n, None]
+            self.emb_t = torch.empty((self.emb_i8.shape[0], self.emb_i8.shape[1]), dtype=torch.float16, device=self.device)
+            self.emb_t[:self.n] = torch.from_numpy(vectors).to(self.device)
+        logger.debug(f"Loaded {self.n} persisted embeddings from {self.persist_directory}")
+    
+    def _allocate(self, path_attr: str, shape: Tuple[int, ...], dtype) -> np.ndarray:
+        """Allocate a matrix, as a new memory-mapped .npy file when persisting."""
+        if self.persist_directory is None:
+            return np.empty(shape, dtype=dtype)
+        return np.lib.format.open_memmap(getattr(self, path_attr) + ".tmp", mode="w+", dtype=dtype, shape=shape)
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Encode texts into L2-normalized float32 embeddings, loading the shared model on first use."""
+        return encode_texts(texts, self.model_name)
+    
+    def _reserve(self, extra_rows: int, dim: int):
+        """Make room for extra_rows more embeddings, doubling capacity as needed."""
+        needed = self.n + extra_rows
+        if self.emb_i8.shape[0] >= needed and self.emb_i8.shape[1] == dim:
+            return
+        capacity = max(needed, 2 * self.emb_i8.shape[0], 64)
+        grown = self._allocate("_emb_path", (capacity, dim), np.int8)
+        grown_scales = self._allocate("_scales_path", (capacity,), np.float32)
+        if self.n:
+            grown[:self.n] = self.emb_i8[:self.n]
+            grown_scales[:self.n] = self.scales[:self.n]
+        if self.persist_directory is not None:
+            # Swap the grown files in; searches still holding the old maps keep working
+            grown.flush()
+            grown_scales.flush()
+            os.replace(self._emb_path + ".tmp", self._emb_path)
+            os.replace(self._scales_path + ".tmp", self._scales_path)
+        self.emb_i8, self.scales = grown, grown_scales
+        
+        if self.device is not None:
+            import torch
+            grown_t = torch.empty((capacity, dim), dtype=torch.float16, device=self.device)
+            if self.n:
+                grown_t[:self.n] = self.emb_t[:self.n]
+            self.emb_t = grown_t
+    
+    def _cache_get(self, cache: OrderedDict, key):
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+    
+    def _cache_put(self, cache: OrderedDict, key, value):
+        with self._cache_lock:
+            cache[key] = value
+            if len(cache) > QUERY_CACHE_SIZE:
+                cache.popitem(last=False)
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """
+        Embed a query the same way stored chunks are embedded.
+        
+        Queries are normalized for whitespace only and their embeddings cached, so a
+        repeated question (or the search right after a cache lookup embedded it) skips
+        the encoder. Case is kept, like in the chunks, so a cased model embeds "TCP" and
+        "tcp" differently and the cache never mixes them up. The returned array is
+        shared and read-only.
+        """
+        query = " ".join(query.split())
+        embedding = self._cache_get(self._query_cache, query)
+        if embedding is None:
+            embedding = self._encode([query])[0]
+            embedding.flags.writeable = False
+            self._cache_put(self._query_cache, query, embedding)
+        return embedding
+    
+    def add_chunks(self, chunks: List[Dict[str, Any]]) -> bool:
+        """
+        Add document chunks to the vector store.
+        
+        Args:
+            chunks: List of dictionaries with 'id', 'document_id', 'content', and 'metadata'
+        
+        Returns:
+            bool: Success or failure
+        """
         try:
-            self.client = chromadb.PersistentClient(path=persist_directory)
+            # Chunk IDs are content-addressed, so a known ID is already stored
+            new_chunks = [chunk for chunk in chunks if chunk["id"] not in self.documents]
+            if not new_chunks:
+                return True
+            
+            # Chunks whose text is already stored (re-uploads, repeated boilerplate) reuse
+            # that row's embedding; the rest are encoded and quantized in one call, outside the lock
+            keys = [_content_key(chunk["content"]) for chunk in new_chunks]
+            cached_rows = [self.content_rows.get(key) for key in keys]
+            hits = [i for i, row in enumerate(cached_rows) if row is not None]
+            misses = [i for i, row in enumerate(cached_rows) if row is None]
+            if not hits:
+                vectors = self._encode([chunk["content"] for chunk in new_chunks])
+                embeddings, scales = quantize_int8(vectors)
+            else:
+                reused = np.asarray([cached_rows[i] for i in hits])
+                dim = self.emb_i8.shape[1]
+                vectors = np.empty((len(new_chunks), dim), dtype=np.float32)
+                embeddings = np.empty((len(new_chunks), dim), dtype=np.int8)
+                scales = np.empty(len(new_chunks), dtype=np.float32)
+                vectors[hits] = self._dequantized(reused)
+                embeddings[hits] = self.emb_i8[reused]
+                scales[hits] = self.scales[reused]
+                if misses:
+                    vectors[misses] = self._encode([new_chunks[i]["content"] for i in misses])
+                    embeddings[misses], scales[misses] = quantize_int8(vectors[misses])
+                logger.debug(f"Reused {len(hits)} stored embeddings, encoded {len(misses)} chunks")
+            
+            with self._write_lock:
+                keep = [i for i, chunk in enumerate(new_chunks) if chunk["id"] not in self.documents]
+                if not keep:
+                    return True
+                new_chunks = [new_chunks[i] for i in keep]
+                keys = [keys[i] for i in keep]
+                embeddings, scales = embeddings[keep], scales[keep]
+                self._reserve(len(new_chunks), embeddings.shape[1])
+                first_row = self.n
+                self.emb_i8[first_row:first_row + len(keep)] = embeddings
+                self.scales[first_row:first_row + len(keep)] = scales
+                if self.device is not None:
+                    import torch
+                    self.emb_t[first_row:first_row + len(keep)] = torch.from_numpy(vectors[keep]).to(self.device)
+                if self._db is not None:
+                    # Store the rows before publishing any of them; if this raises they never go live
+                    self._persist(first_row, new_chunks)
+                for chunk, key in zip(new_chunks, keys):
+                    chunk_id = chunk["id"]
+                    self.documents[chunk_id] = chunk["content"]
+                    self.metadata.append(
+                        chunk["document_id"],
+                        chunk.get("page_number"),
+                        chunk.get("chunk_index", 0),
+                        chunk.get("metadata", {})
+                    )
+                    
+                    row = self.n
+                    self.chunk_rows[chunk_id] = row
+                    self.chunk_ids.append(chunk_id)
+                    self.content_rows.setdefault(key, row)
+                    # Publish the row last so concurrent searches only see complete rows
+                    self.n = row + 1
+            
+            if self._use_faiss and self.n >= HNSW_MIN_ROWS:
+                self._ann_update.set()
+            return True
+            
         except Exception as e:
-            print(f"Failed to initialize ChromaDB: {e}")
-            self.use_simple_store = True
-            self._impl = SimpleDictVectorStore()
-            return
+            print(f"Error adding chunks to embedding vector store: {e}")
+            return False
+    
+    def _persist(self, first_row: int, chunks: List[Dict[str, Any]]):
+        """
+        Record rows first_row onwards, after flushing their embeddings so a crash never leaves a row without one.
+        
+        Callers persist rows before publishing them; on failure the transaction is rolled
+        back and the error re-raised, so no row is live in memory without being stored.
+        The document ID has its own column, the metadata JSON holds the remaining fields.
+        """
+        self.emb_i8.flush()
+        self.scales.flush()
+        try:
+            self._db.executemany(
+                "INSERT INTO chunks (row, id, document_id, content, metadata) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        first_row + i, chunk["id"], chunk["document_id"], chunk["content"],
+                        json.dumps({
+                            "page_number": chunk.get("page_number"),
+                            "chunk_index": chunk.get("chunk_index", 0),
+                            **chunk.get("metadata", {})
+                        })
+                    )
+                    for i, chunk in enumerate(chunks)
+                ]
+            )
+            self._db.commit()
+        except Exception:
+            self._db.rollback()
+            raise
+    
+    def remove_documents_except(self, document_ids: Set[str]) -> int:
+        """
+        Drop the rows of every document not in document_ids.
+        
+        Rows are otherwise only ever appended, so this compacts the whole store and
+        drops the FAISS index. It is meant for startup, to drop chunks persisted for
+        documents the document store no longer has or that never finished processing.
+        
+        Returns:
+            int: Number of rows removed
+        """
+        with self._write_lock, self._ann_lock:
+            num_rows = self.n
+            keep_codes = [code for code, doc_id in enumerate(self.metadata.doc_names) if doc_id in document_ids]
+            keep = np.flatnonzero(np.isin(self.metadata.doc_code[:num_rows], keep_codes))
+            removed = num_rows - len(keep)
+            if not removed:
+                return 0
+            
+            chunks = []
+            for row in keep:
+                chunk_id = self.chunk_ids[row]
+                metadata = self.metadata.get(row)
+                chunks.append({
+                    "id": chunk_id,
+                    "document_id": metadata.pop("document_id"),
+                    "content": self.documents[chunk_id],
+                    "page_number": metadata.pop("page_number"),
+                    "chunk_index": metadata.pop("chunk_index"),
+                    "metadata": metadata
+                })
+            self._replace_rows(chunks, self.emb_i8[keep], self.scales[keep])
         
-        # Use SentenceTransformers for embeddings (Gemini does not provide embeddings)
+        logger.debug(f"Removed {removed} rows of documents that are no longer stored, kept {len(chunks)}")
+        return removed
+    
+    def _replace_rows(self, chunks: List[Dict[str, Any]], embeddings: np.ndarray, scales: np.ndarray):
+        """
+        Replace every row of the store with the given chunks and their quantized embeddings.
+        
+        The caller holds _write_lock and _ann_lock. Row numbers change, so the FAISS
+        index and cached results are dropped.
+        """
+        dim = embeddings.shape[1]
+        
+        # Start over with an empty store and write the rows back
+        self.documents = {}
+        self.metadata = ChunkMetadata()
+        self.chunk_ids = []
+        self.chunk_rows = {}
+        self.content_rows = {}
+        self.emb_i8 = np.empty((0, 0), dtype=np.int8)
+        self.scales = np.empty(0, dtype=np.float32)
+        self.emb_t = None
+        self.n = 0
+        self._reserve(len(chunks), dim)
+        self.emb_i8[:len(chunks)] = embeddings
+        self.scales[:len(chunks)] = scales
+        if self.device is not None:
+            import torch
+            self.emb_t[:len(chunks)] = torch.from_numpy(embeddings.astype(np.float32) * scales[:, None]).to(self.device)
+        if self._db is not None:
+            self._db.execute("DELETE FROM chunks")
+            self._persist(0, chunks)
+            if os.path.exists(self._ann_path):
+                os.remove(self._ann_path)
+        for row, chunk in enumerate(chunks):
+            self.documents[chunk["id"]] = chunk["content"]
+            self.metadata.append(chunk["document_id"], chunk["page_number"], chunk["chunk_index"], chunk["metadata"])
+            self.chunk_rows[chunk["id"]] = row
+            self.chunk_ids.append(chunk["id"])
+            self.content_rows.setdefault(_content_key(chunk["content"]), row)
+        self.n = len(chunks)
+        
+        # Cached results refer to rows by position
+        with self._cache_lock:
+            self._result_cache.clear()
+        
+        self._ann = None
+        self._ann_rows = 0
+        self._ann_dirty = False
+        self._ann_generation += 1
+    
+    def search(self, query: str, filter_dict: Optional[Dict[str, Any]] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for relevant document chunks by cosine similarity.
+        
+        Args:
+            query: The search query
+            filter_dict: Optional filter (e.g., {"document_id": "doc123"})
+            limit: Maximum number of results
+            
+        Returns:
+            List of relevant chunks with metadata
+        """
         try:
-            print("Using SentenceTransformers for vector store (Gemini migration)")
-            log_debug("Using SentenceTransformers (Gemini migration)")
-            self.embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
+            num_rows = self.n
+            if not num_rows or limit <= 0:
+                return []
+            
+            # Filter chunks by document_id if specified, scoring only that document's rows
+            rows = None
+            num_candidates = num_rows
+            if filter_dict and "document_id" in filter_dict:
+                rows = self.metadata.rows_of(filter_dict["document_id"], num_rows)
+                num_candidates = len(rows)
+            
+            k = min(limit, num_candidates)
+            if k <= 0:
+                return []
+            
+            query_embedding = self.embed_query(query)
+            
+            # Queries whose quantized embeddings match return the same results, until rows are added
+            q_i8, _ = quantize_int8(query_embedding)
+            cache_key = (
+                hashlib.blake2b(q_i8.tobytes(), digest_size=16).digest(),
+                filter_dict.get("document_id") if filter_dict else None,
+                limit,
+                num_rows
             )
-            log_debug("Successfully initialized SentenceTransformers")
+            cached = self._cache_get(self._result_cache, cache_key)
+            if cached is not None:
+                return self._copy_results(cached)
+            
+            found = None
+            if self.device is not None:
+                found = self._top_rows_torch(query_embedding, rows, k, num_rows)
+            elif rows is None and self._use_faiss and num_rows >= HNSW_MIN_ROWS:
+                if self._ann_rows < num_rows:
+                    self._ann_update.set()
+                found = self._top_rows_faiss(query_embedding, k, num_rows)
+            if found is None:
+                found = self._top_rows_numpy(query_embedding, rows, k, num_rows)
+            top, top_scores = found
+            
+            # Format results
+            results = []
+            for row, score in zip(top, top_scores):
+                chunk_id = self.chunk_ids[row]
+                results.append({
+                    "content": self.documents[chunk_id],
+                    "metadata": self.metadata.get(row),
+                    "id": chunk_id,
+                    "distance": 1.0 - float(score)  # Cosine distance (lower is better)
+                })
+            
+            self._cache_put(self._result_cache, cache_key, results)
+            return self._copy_results(results)
+            
         except Exception as e:
-            print(f"Failed to initialize SentenceTransformers: {e}")
-            log_debug(f"Failed to initialize SentenceTransformers: {e}")
-            self.use_simple_store = True
-            self._impl = SimpleDictVectorStore()
+            print(f"Error searching embedding vector store: {e}")
+            return []
+    
+    @staticmethod
+    def _copy_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Copy cached search results, so callers can modify them without changing the cache."""
+        return [{**result, "metadata": dict(result["metadata"])} for result in results]
+    
+    def _top_rows_numpy(self, query_embedding: np.ndarray, rows: Optional[np.ndarray], k: int, num_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Score the int8 matrix (or just the given rows) on the CPU and return the top k rows with their scores."""
+        # Embeddings are normalized, so cosine similarity is a dot product. The int8 rows are
+        # widened block by block; int8 products summed over a few hundred dims stay exact in
+        # float32, so BLAS computes the integer dot product and the scales restore the cosine.
+        q_i8, q_scale = quantize_int8(query_embedding)
+        q = q_i8[0].astype(np.float32)
+        count = num_rows if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        for start in range(0, count, SCORE_BLOCK_ROWS):
+            end = min(start + SCORE_BLOCK_ROWS, count)
+            block = self.emb_i8[start:end] if rows is None else self.emb_i8[rows[start:end]]
+            scores[start:end] = block.astype(np.float32) @ q
+        scores *= (self.scales[:num_rows] if rows is None else self.scales[rows]) * q_scale[0]
+        
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return (top if rows is None else rows[top]), scores[top]
+    
+    def _dequantized(self, rows) -> np.ndarray:
+        """Get float32 copies of the given rows (a slice or an index array) of the int8 matrix."""
+        return self.emb_i8[rows].astype(np.float32) * self.scales[rows, None]
+    
+    def _build_ann_index(self, num_rows: int):
+        """Create an empty FAISS index suited to num_rows embeddings, training it if it needs a sample."""
+        import faiss
+        dim = self.emb_i8.shape[1]
+        if num_rows >= PQ_MIN_ROWS:
+            nlist, m, _ = ivfpq_params(num_rows, dim)
+            index = faiss.index_factory(dim, f"IVF{nlist},PQ{m}", faiss.METRIC_INNER_PRODUCT)
+            # k-means for the coarse lists and the 256-centroid sub-quantizers needs a few
+            # dozen points per centroid; a random sample of that size trains as well as all rows
+            sample_size = min(num_rows, max(64 * nlist, 256 * 64))
+            sample = np.sort(np.random.default_rng(0).choice(num_rows, size=sample_size, replace=False))
+            index.train(self._dequantized(sample))
+            logger.debug(f"Building IVF-PQ index over {num_rows} embeddings (nlist={nlist}, M={m})")
+        else:
+            m, ef_construction, _ = hnsw_params(num_rows)
+            # Graph vectors stored as fp16, half the bytes per distance computation of a flat index
+            index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_fp16, m, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = ef_construction
+            logger.debug(f"Building HNSW index over {num_rows} embeddings (M={m})")
+        return index
+    
+    def _read_ann_index(self):
+        """
+        Load the FAISS index saved by an earlier run, if it matches the persisted embeddings.
+        
+        Returns:
+            Tuple of (index or None, whether the index is a read-only memory map)
+        """
+        if self._ann_path is None or not os.path.exists(self._ann_path):
+            return None, False
+        import faiss
+        try:
+            # IVF-PQ codes are memory-mapped, so startup reads only the index header and
+            # searches page in just the lists they probe; HNSW graphs are read into memory
+            index = faiss.read_index(self._ann_path, faiss.IO_FLAG_MMAP)
+        except Exception as e:
+            print(f"Error reading FAISS index {self._ann_path}: {e}")
+            return None, False
+        # Rows are only ever appended, so an index over a prefix of them just needs catching up
+        if index.d != self.emb_i8.shape[1] or index.ntotal > self.n:
+            logger.debug(f"Discarding FAISS index {self._ann_path}, it doesn't match the stored embeddings")
+            return None, False
+        logger.debug(f"Loaded FAISS index over {index.ntotal} embeddings from {self._ann_path}")
+        return index, isinstance(index, faiss.IndexIVF)
+    
+    def _write_ann_index(self):
+        """Save the FAISS index next to the persisted embeddings, replacing the previous file atomically."""
+        if self._ann_path is None:
+            return
+        import faiss
+        try:
+            faiss.write_index(self._ann, self._ann_path + ".tmp")
+            os.replace(self._ann_path + ".tmp", self._ann_path)
+        except Exception as e:
+            print(f"Error writing FAISS index {self._ann_path}: {e}")
             return
+        self._ann_dirty = False
+        self._ann_saved_at = time.monotonic()
+    
+    def flush_ann_index(self):
+        """Save the FAISS index if it has rows that are not saved yet."""
+        with self._ann_lock:
+            if self._ann_dirty:
+                self._write_ann_index()
+    
+    def _ann_worker(self):
+        """Background thread: update the FAISS index whenever rows are added, saving it once it settles."""
+        while True:
+            woken = self._ann_update.wait(timeout=ANN_SAVE_INTERVAL if self._ann_dirty else None)
+            self._ann_update.clear()
+            try:
+                if woken:
+                    self._update_ann_index()
+                if self._ann_dirty and time.monotonic() - self._ann_saved_at >= ANN_SAVE_INTERVAL:
+                    self.flush_ann_index()
+            except Exception as e:
+                print(f"Error updating FAISS index: {e}")
+    
+    def _update_ann_index(self):
+        """
+        Bring the FAISS index up to date with the stored rows.
+        
+        Up to PQ_MIN_ROWS rows this is an HNSW graph over fp16 copies of the embeddings;
+        past that it is rebuilt once as IVF-PQ. A new index (loaded from the saved file,
+        or built) is filled before it is published, so searches keep using the previous
+        index or exact scoring meanwhile. Rows added later are appended to the published
+        index ANN_ADD_BATCH_ROWS at a time under _ann_lock.
+        """
+        import faiss
+        generation = self._ann_generation
+        num_rows = self.n
+        index, mapped = self._ann, self._ann_mapped
+        if index is None:
+            index, mapped = self._read_ann_index()
+        if index is None or (not isinstance(index, faiss.IndexIVF) and num_rows >= PQ_MIN_ROWS):
+            index, mapped = self._build_ann_index(num_rows), False
+        elif mapped and index.ntotal < num_rows:
+            # Mapped inverted lists are read-only, load them before adding rows
+            index, mapped = faiss.read_index(self._ann_path), False
+        
+        if index is not self._ann:
+            loaded_rows = index.ntotal
+            for start in range(loaded_rows, num_rows, ANN_ADD_BATCH_ROWS):
+                index.add(self._dequantized(slice(start, min(start + ANN_ADD_BATCH_ROWS, num_rows))))
+            with self._ann_lock:
+                if generation != self._ann_generation:
+                    return
+                self._ann = index
+                self._ann_pq = isinstance(index, faiss.IndexIVF)
+                self._ann_mapped = mapped
+                self._ann_rows = num_rows
+                # Unsaved unless it is the saved index, unchanged
+                self._ann_dirty = index.ntotal != loaded_rows or loaded_rows == 0
+            return
+        
+        for start in range(self._ann_rows, num_rows, ANN_ADD_BATCH_ROWS):
+            end = min(start + ANN_ADD_BATCH_ROWS, num_rows)
+            vectors = self._dequantized(slice(start, end))
+            with self._ann_lock:
+                if generation != self._ann_generation:
+                    return
+                self._ann.add(vectors)
+                self._ann_rows = end
+                self._ann_dirty = True
+    
+    def _top_rows_faiss(self, query_embedding: np.ndarray, k: int, num_rows: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Find approximately the top k rows with the FAISS index.
         
-        # Create or get collection
+        The index proposes candidates (k from HNSW, PQ_RERANK_FACTOR * k from the coarser
+        IVF-PQ distances), and together with any rows the index doesn't have yet they are
+        re-scored exactly in int8. The search never waits for the background thread.
+        
+        Returns:
+            The top rows and their scores, or None if the index isn't built or is being
+            updated, in which case the caller scores every row exactly
+        """
+        if not self._ann_lock.acquire(blocking=False):
+            return None
         try:
-            self.collection = self.client.get_or_create_collection(
-                name="document_chunks",
-                embedding_function=self.embedding_function
-            )
-            log_debug("Successfully created or got ChromaDB collection")
+            if self._ann is None:
+                return None
+            indexed = min(self._ann_rows, num_rows)
+            query = np.asarray(query_embedding, dtype=np.float32).reshape(1, -1)
+            if self._ann_pq:
+                self._ann.nprobe = ivfpq_params(self._ann_rows, self.emb_i8.shape[1])[2]
+                _, ids = self._ann.search(query, k * PQ_RERANK_FACTOR)
+            else:
+                self._ann.hnsw.efSearch = max(hnsw_params(self._ann_rows)[2], k)
+                _, ids = self._ann.search(query, k)
+        finally:
+            self._ann_lock.release()
+        
+        ids = ids[0][(ids[0] >= 0) & (ids[0] < num_rows)]
+        candidates = np.union1d(ids, np.arange(indexed, num_rows)).astype(np.int32)
+        if len(candidates) == 0:
+            return candidates, np.empty(0, dtype=np.float32)
+        return self._top_rows_numpy(query_embedding, candidates, min(k, len(candidates)), num_rows)
+    
+    def _top_rows_torch(self, query_embedding: np.ndarray, rows: Optional[np.ndarray], k: int, num_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Score the fp16 embeddings (or just the given rows) on self.device and return the top k rows with their scores."""
+        import torch
+        with torch.inference_mode():
+            q = torch.tensor(query_embedding, dtype=torch.float16, device=self.device)
+            if rows is None:
+                emb = self.emb_t[:num_rows]
+            else:
+                emb = self.emb_t[torch.from_numpy(rows.astype(np.int64)).to(self.device)]
+            top_scores, top = torch.topk(torch.mv(emb, q), k)
+        top = top.cpu().numpy()
+        return (top if rows is None else rows[top]), top_scores.float().cpu().numpy()
+
+class VectorStore:
+    def __init__(self, persist_directory: str = DATA_DIR):
+        """
+        Initialize the vector store.
+        
+        Chunks are stored in the persistent EmbeddingVectorStore, or in ChromaDB when
+        VECTOR_STORE=chroma. If neither can start, SimpleDictVectorStore's in-memory
+        keyword matching is a last-resort fallback for installs without an embedding model.
+        """
+        # Create directory if it doesn't exist
+        os.makedirs(persist_directory, exist_ok=True)
+        
+        # Bounds concurrent searches on worker threads, created on first use inside the event loop
+        self._search_semaphore: Optional[asyncio.Semaphore] = None
+        
+        if VECTOR_STORE == "chroma":
+            try:
+                self._init_chroma(os.path.join(persist_directory, "chroma"))
+                self.use_simple_store = False
+                print("Using ChromaDB for vector storage")
+                logger.debug("Initialized ChromaDB vector store")
+                return
+            except Exception as e:
+                print(f"Failed to initialize ChromaDB: {e}")
+                logger.debug(f"Failed to initialize ChromaDB: {e}")
+        
+        self.use_simple_store = True
+        try:
+            self._impl = EmbeddingVectorStore(persist_directory=os.path.join(persist_directory, "embeddings"))
+            print("Using EmbeddingVectorStore for vector storage")
+            logger.debug("Initialized EmbeddingVectorStore")
         except Exception as e:
-            print(f"Failed to create ChromaDB collection: {e}")
-            log_debug(f"Failed to create ChromaDB collection: {e}")
-            self.use_simple_store = True
+            print(f"Failed to initialize EmbeddingVectorStore: {e}")
+            logger.debug(f"Embedding vector store unavailable ({e}), using keyword search")
             self._impl = SimpleDictVectorStore()
+            print("Using SimpleDictVectorStore for vector storage")
+            logger.debug("Initialized SimpleDictVectorStore")
+    
+    def _init_chroma(self, persist_directory: str):
+        """Set up the ChromaDB client, embedding function and collection, raising on any failure."""
+        # chromadb takes seconds to import, so it is only imported once a store is created
+        if importlib.util.find_spec("chromadb") is None:
+            raise ImportError("chromadb is not installed")
+        import chromadb
+        
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        
+        # Use SentenceTransformers for embeddings (Gemini does not provide embeddings),
+        # sharing the model with any other store in the process
+        self.embedding_function = SharedEmbeddingFunction(EMBEDDING_MODEL)
+        logger.debug("Successfully initialized SentenceTransformers")
+        
+        # Create or get collection. Embeddings of different models can't share a collection,
+        # so models other than the default get their own
+        collection_name = "document_chunks"
+        if EMBEDDING_MODEL != DEFAULT_EMBEDDING_MODEL:
+            collection_name += "_" + hashlib.blake2b(EMBEDDING_MODEL.encode(), digest_size=8).hexdigest()
+        self.collection = self.client.get_or_create_collection(
+            name=collection_name,
+            embedding_function=self.embedding_function
+        )
+        logger.debug("Successfully created or got ChromaDB collection")
     
     def add_chunks(self, chunks: List[Dict[str, Any]]) -> bool:
         """
@@ -175,22 +1229,38 @@ class VectorStore:
             return self._impl.add_chunks(chunks)
             
         try:
+            # Skip chunks that are already stored rather than embedding them again
+            existing_ids = set(self.collection.get(ids=[chunk["id"] for chunk in chunks], include=[])["ids"])
+            chunks = [chunk for chunk in chunks if chunk["id"] not in existing_ids]
+            if not chunks:
+                return True
+            
             # Format data for ChromaDB
             ids = [chunk["id"] for chunk in chunks]
             documents = [chunk["content"] for chunk in chunks]
             metadatas = [
                 {
-                    "document_id": chunk["document_id"],
-                    "page_number": chunk.get("page_number"),
-                    "chunk_index": chunk.get("chunk_index", 0),
-                    **chunk.get("metadata", {})
+                    key: value
+                    for key, value in {
+                        "document_id": chunk["document_id"],
+                        "page_number": chunk.get("page_number"),
+                        "chunk_index": chunk.get("chunk_index", 0),
+                        **chunk.get("metadata", {})
+                    }.items()
+                    # ChromaDB rejects None metadata values, e.g. the page number of an image
+                    if value is not None
                 }
                 for chunk in chunks
             ]
             
+            # Embed the whole batch in one encode call (which length-sorts texts to cut
+            # padding) and hand Chroma the vectors, rather than going through its callback
+            embeddings = encode_texts(documents, self.embedding_function.model_name)
+            
             # Add to collection
             self.collection.add(
                 ids=ids,
+                embeddings=embeddings.tolist(),
                 documents=documents,
                 metadatas=metadatas
             )
@@ -201,6 +1271,84 @@ class VectorStore:
             print(f"Error adding chunks to vector store: {e}")
             return False
     
+    def remove_documents_except(self, document_ids: Set[str]) -> int:
+        """
+        Remove the chunks of every document not in document_ids.
+        
+        Args:
+            document_ids: IDs of the documents whose chunks to keep
+            
+        Returns:
+            int: Number of chunks removed
+        """
+        try:
+            if self.use_simple_store:
+                remove = getattr(self._impl, "remove_documents_except", None)
+                return remove(document_ids) if remove else 0
+            
+            stored = self.collection.get(include=["metadatas"])
+            orphan_ids = [
+                chunk_id
+                for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+                if metadata.get("document_id") not in document_ids
+            ]
+            if orphan_ids:
+                self.collection.delete(ids=orphan_ids)
+            return len(orphan_ids)
+            
+        except Exception as e:
+            print(f"Error removing chunks from vector store: {e}")
+            return 0
+    
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """
+        Embed a query with the same embedding function used for the stored chunks.
+        
+        Args:
+            query: The text to embed
+            
+        Returns:
+            The query embedding, or None if the store has no embedding function
+        """
+        try:
+            if self.use_simple_store:
+                embed = getattr(self._impl, "embed_query", None)
+                return embed(query) if embed else None
+            return np.asarray(self.embedding_function([query])[0], dtype=np.float32)
+        except Exception as e:
+            print(f"Error embedding query: {e}")
+            return None
+    
+    def _searches(self) -> asyncio.Semaphore:
+        if self._search_semaphore is None:
+            self._search_semaphore = asyncio.Semaphore(os.cpu_count() or 4)
+        return self._search_semaphore
+    
+    async def aembed_query(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query on a worker thread, see embed_query."""
+        async with self._searches():
+            return await asyncio.to_thread(self.embed_query, query)
+    
+    async def asearch(self, query: str, filter_dict: Optional[Dict[str, Any]] = None, limit: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for relevant document chunks without blocking the event loop.
+        
+        The search runs on a worker thread, with at most one search per CPU at a time.
+        Query encoding and NumPy's matrix products release the GIL, so concurrent
+        searches actually run in parallel. Writes are already safe to run alongside:
+        the in-memory stores lock them internally and ChromaDB handles its own.
+        
+        Args:
+            query: The search query
+            filter_dict: Optional filter (e.g., {"document_id": "doc123"})
+            limit: Maximum number of results
+            
+        Returns:
+            List of relevant chunks with metadata
+        """
+        async with self._searches():
+            return await asyncio.to_thread(self.search, query, filter_dict, limit)
+    
     def search(self, query: str, filter_dict: Optional[Dict[str, Any]] = None, limit: int = 5) -> List[Dict[str, Any]]:
         """
         Search for relevant document chunks.
@@ -244,8 +1392,16 @@ class VectorStore:
 _vector_store = None
 
 def get_vector_store() -> VectorStore:
-    """Get the vector store singleton instance."""
+    """
+    Get the vector store singleton instance.
+    
+    When the store is opened, chunks persisted for documents that are not ready in
+    the document store (deleted, or interrupted while processing) are removed, so
+    searches across all documents only find documents that are listed.
+    """
     global _vector_store
     if _vector_store is None:
-        _vector_store = VectorStore()
+        vector_store = VectorStore()
+        vector_store.remove_documents_except(get_document_store().ready_document_ids())
+        _vector_store = vector_store
     return _vector_store
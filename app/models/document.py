@@ -18,10 +18,35 @@ class DocumentResponse(DocumentBase):
 class DocumentList(BaseModel):
     documents: List[DocumentResponse]
     
-class DocumentChunk(BaseModel):
-    id: str
-    document_id: str
-    content: str
-    page_number: Optional[int] = None
-    chunk_index: int
-    metadata: Dict[str, Any] = {}
+class DocumentChunk:
+    """
+    A chunk of extracted document text.
+    
+    Chunks are created in bulk during ingestion and only ever kept in memory, so this
+    is a plain slotted class rather than a model: no per-instance __dict__ and no
+    validation of data the processor has just produced itself.
+    """
+    __slots__ = ("id", "document_id", "content", "page_number", "chunk_index", "metadata")
+    
+    def __init__(
+        self,
+        id: str,
+        document_id: str,
+        content: str,
+        chunk_index: int,
+        page_number: Optional[int] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.document_id = document_id
+        self.content = content
+        self.page_number = page_number
+        self.chunk_index = chunk_index
+        self.metadata = metadata if metadata is not None else {}
+    
+    def model_dump(self) -> Dict[str, Any]:
+        """Get the chunk's fields as a dict, like BaseModel.model_dump."""
+        return {name: getattr(self, name) for name in self.__slots__}
+    
+    def __repr__(self) -> str:
+        return f"DocumentChunk(id={self.id!r}, document_id={self.document_id!r}, chunk_index={self.chunk_index!r})"
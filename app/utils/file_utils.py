@@ -1,32 +1,114 @@
 import os
+import io
 import shutil
-from typing import List, Tuple, Optional
-from fastapi import UploadFile, HTTPException
+import asyncio
+import hashlib
+from typing import List, Tuple, Optional, BinaryIO
+import aiofiles
+from fastapi import UploadFile
 
-def save_upload_file(upload_file: UploadFile, destination: str) -> str:
+# Directory the stores persist to (embeddings, document metadata, cached answers)
+DATA_DIR = os.environ.get("DATA_DIR", "data")
+
+# Buffer size for user-space copies when a kernel-side copy isn't possible
+COPY_BUFSIZE = 1024 * 1024  # 1 MiB
+# Maximum number of bytes handed to a single os.sendfile call
+SENDFILE_CHUNK_SIZE = 64 * 1024 * 1024  # 64 MiB
+
+def _spooled_fileno(file_obj: BinaryIO) -> Optional[int]:
     """
-    Save an uploaded file to the specified destination.
+    Get the OS-level file descriptor backing an uploaded file, if any.
+    
+    SpooledTemporaryFile only has a real descriptor once it has rolled over
+    to disk; calling fileno() before that would force a rollover, so small
+    in-memory uploads return None instead.
     
     Args:
-        upload_file: The uploaded file
-        destination: The destination path
+        file_obj: The file object to inspect
         
     Returns:
-        str: The path to the saved file
+        Optional[int]: The file descriptor, or None if not backed by a file
     """
+    if not getattr(file_obj, "_rolled", True):
+        return None
     try:
-        # Create directory if it doesn't exist
-        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        return file_obj.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+def copy_file_stream(source: BinaryIO, destination: BinaryIO) -> None:
+    """
+    Copy the remaining contents of source into destination.
+    
+    Uses os.sendfile for a zero-copy transfer when source is backed by a real
+    file on disk, falling back to a buffered copy with a large buffer.
+    
+    Args:
+        source: The file object to read from (e.g. UploadFile.file)
+        destination: The file object to write to, opened in binary mode
+    """
+    src_fd = _spooled_fileno(source)
+    if src_fd is not None and hasattr(os, "sendfile"):
+        src_start = source.tell()
+        destination.flush()
+        dst_start = destination.tell()
+        try:
+            dst_fd = destination.fileno()
+            offset = src_start
+            while True:
+                sent = os.sendfile(dst_fd, src_fd, offset, SENDFILE_CHUNK_SIZE)
+                if sent == 0:
+                    break
+                offset += sent
+            source.seek(offset)
+            return
+        except OSError:
+            # sendfile isn't supported for this pair of files, rewind and copy normally
+            source.seek(src_start)
+            destination.seek(dst_start)
+            destination.truncate()
+    
+    shutil.copyfileobj(source, destination, COPY_BUFSIZE)
+
+async def write_upload_file(upload_file: UploadFile, destination: str) -> None:
+    """
+    Write an uploaded file to destination without blocking the event loop.
+    
+    Uploads that have been spooled to disk are copied with copy_file_stream
+    (os.sendfile) on a worker thread; in-memory uploads are streamed out
+    through aiofiles.
+    
+    Args:
+        upload_file: The uploaded file
+        destination: The destination path
+    """
+    if _spooled_fileno(upload_file.file) is not None:
+        def copy():
+            with open(destination, "wb") as buffer:
+                copy_file_stream(upload_file.file, buffer)
         
-        # Save the file
-        with open(destination, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
+        await asyncio.to_thread(copy)
+        return
+    
+    async with aiofiles.open(destination, "wb") as buffer:
+        while chunk := await upload_file.read(COPY_BUFSIZE):
+            await buffer.write(chunk)
+
+def file_digest(file_path: str) -> str:
+    """
+    Compute a content hash of a file, reading it in COPY_BUFSIZE blocks.
+    
+    Args:
+        file_path: The path to the file
         
-        return destination
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Could not save file: {str(e)}")
-    finally:
-        upload_file.file.close()
+    Returns:
+        str: The hex BLAKE2b digest of the file contents
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        while block := f.read(COPY_BUFSIZE):
+            digest.update(block)
+    return digest.hexdigest()
 
 def validate_file_type(filename: str, allowed_extensions: List[str]) -> bool:
     """
@@ -0,0 +1,44 @@
+import os
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# File that debug messages are written to, rotated once it reaches DEBUG_LOG_MAX_BYTES
+DEBUG_LOG_FILE = "debug.txt"
+DEBUG_LOG_MAX_BYTES = 10_000_000
+DEBUG_LOG_BACKUPS = 3
+
+def _create_logger() -> logging.Logger:
+    """
+    Create the application logger.
+
+    Records are put on an in-memory queue and written to DEBUG_LOG_FILE by a
+    background listener thread, so logging never does file I/O on the caller's
+    thread. The file is rotated so it cannot grow without bound. Set LOG_LEVEL
+    (e.g. WARNING in production) to drop debug messages; an unknown level
+    falls back to DEBUG.
+    """
+    app_logger = logging.getLogger("app")
+    level_name = (os.environ.get("LOG_LEVEL") or "DEBUG").upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        # getLevelName returns "Level <name>" for names it doesn't know
+        print(f"Unknown LOG_LEVEL {level_name!r}, logging at DEBUG")
+        level = logging.DEBUG
+    app_logger.setLevel(level)
+    app_logger.propagate = False
+
+    log_queue = queue.SimpleQueue()
+    app_logger.addHandler(QueueHandler(log_queue))
+
+    file_handler = RotatingFileHandler(DEBUG_LOG_FILE, maxBytes=DEBUG_LOG_MAX_BYTES, backupCount=DEBUG_LOG_BACKUPS)
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    listener = QueueListener(log_queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+
+    return app_logger
+
+logger = _create_logger()
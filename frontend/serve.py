@@ -1,12 +1,20 @@
 #!/usr/bin/env python3
 import http.server
-import socketserver
 import os
 
 # Set the port
 PORT = 8080
 
 class MyHandler(http.server.SimpleHTTPRequestHandler):
+    # Keep connections open so a page's scripts and styles reuse one connection
+    protocol_version = "HTTP/1.1"
+    
+    def copyfile(self, source, outputfile):
+        # Send files straight from the page cache with sendfile(2); socket.sendfile
+        # falls back to plain sends for in-memory sources such as directory listings
+        outputfile.flush()
+        self.connection.sendfile(source)
+    
     def end_headers(self):
         # Add CORS headers for local development
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -14,9 +22,9 @@ class MyHandler(http.server.SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-Type')
         super().end_headers()
 
-# Set up and start the server
+# Set up and start the server, one thread per connection so tabs don't block each other
 handler = MyHandler
-with socketserver.TCPServer(("", PORT), handler) as httpd:
+with http.server.ThreadingHTTPServer(("", PORT), handler) as httpd:
     print(f"Serving frontend at http://localhost:{PORT}")
     print("Press Ctrl+C to stop")
     httpd.serve_forever() 
\ No newline at end of file
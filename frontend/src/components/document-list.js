@@ -1,5 +1,15 @@
 // Document list component
 const documentList = {
+    // Locale-aware formatter built once; toLocaleString would set up a new one for every date
+    dateFormatter: new Intl.DateTimeFormat(undefined, {
+        year: 'numeric', month: 'numeric', day: 'numeric',
+        hour: 'numeric', minute: 'numeric', second: 'numeric'
+    }),
+    
+    // Number of documents rendered per page of the list, and how many are currently shown
+    pageSize: 20,
+    visibleCount: 20,
+    
     // Update the document list UI
     updateDocumentList(documents) {
         const listElement = document.getElementById('document-list');
@@ -18,8 +28,10 @@ const documentList = {
             return;
         }
         
-        // Add each document to the list
-        documents.forEach(doc => {
+        // Add the visible documents to the list, building the items off-DOM so the
+        // list is laid out once however many documents there are
+        const fragment = document.createDocumentFragment();
+        documents.slice(0, this.visibleCount).forEach(doc => {
             const item = document.createElement('li');
             item.className = 'list-group-item document-item';
             
@@ -41,9 +53,28 @@ const documentList = {
             item.appendChild(statusBadge);
             
             // Add item to list
-            listElement.appendChild(item);
+            fragment.appendChild(item);
         });
         
+        // Render the rest of a long library only on request
+        const hiddenCount = documents.length - this.visibleCount;
+        if (hiddenCount > 0) {
+            const loadMoreItem = document.createElement('li');
+            loadMoreItem.className = 'list-group-item text-center';
+            const loadMoreButton = document.createElement('button');
+            loadMoreButton.type = 'button';
+            loadMoreButton.className = 'btn btn-link btn-sm';
+            loadMoreButton.textContent = `Load more (${hiddenCount} remaining)`;
+            loadMoreButton.addEventListener('click', () => {
+                this.visibleCount += this.pageSize;
+                this.updateDocumentList(documents);
+            });
+            loadMoreItem.appendChild(loadMoreButton);
+            fragment.appendChild(loadMoreItem);
+        }
+        
+        listElement.appendChild(fragment);
+        
         // Update document selects
         this.updateDocumentSelects(documents);
     },
@@ -115,6 +146,6 @@ const documentList = {
         if (!dateString) return '';
         
         const date = new Date(dateString);
-        return date.toLocaleString();
+        return this.dateFormatter.format(date);
     }
 }; 
\ No newline at end of file
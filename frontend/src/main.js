@@ -205,16 +205,25 @@ async function askQuestion(question, documentId) {
     showResponseLoader();
     
     try {
-        const response = await api.ask(question, documentId);
-        
-        // Update response container
         const responseContainer = document.getElementById('response-container');
-        responseContainer.innerHTML = `
-            <h4>Question:</h4>
-            <p>${response.question}</p>
-            <h4>Answer:</h4>
-            <div class="response-content">${response.answer}</div>
-        `;
+        let answerElement = null;
+        
+        // Render the answer while it streams in rather than waiting for all of it
+        await api.askStream(question, documentId, (answer) => {
+            if (!answerElement) {
+                hideResponseLoader();
+                responseContainer.innerHTML = `
+                    <h4>Question:</h4>
+                    <p class="question-text"></p>
+                    <h4>Answer:</h4>
+                    <div class="response-content"></div>
+                `;
+                // The question and answer are plain text, never parse them as HTML
+                responseContainer.querySelector('.question-text').textContent = question;
+                answerElement = responseContainer.querySelector('.response-content');
+            }
+            answerElement.textContent = answer;
+        });
     } catch (error) {
         console.error('Error asking question:', error);
         showErrorResponse('Error asking question. Please try again.');
@@ -90,6 +90,44 @@ const api = {
         });
     },
     
+    // Stream an answer, calling onText with the answer received so far as each piece arrives
+    async askStream(question, documentId = null, onText) {
+        const endpoint = '/questions/ask/stream';
+        try {
+            const response = await fetch(`${this.baseUrl}${endpoint}`, {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({
+                    question,
+                    document_id: documentId || null
+                })
+            });
+            
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({}));
+                throw new Error(errorData.detail || `Request failed with status ${response.status}`);
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let answer = '';
+            while (true) {
+                const { done, value } = await reader.read();
+                if (done) break;
+                answer += decoder.decode(value, { stream: true });
+                onText(answer);
+            }
+            answer += decoder.decode();
+            onText(answer);
+            return answer;
+        } catch (error) {
+            console.error(`API error for ${endpoint}:`, error);
+            throw error;
+        }
+    },
+    
     // Flashcard endpoints
     async generateFlashcards(documentId, count = 5, topic = null) {
         return this.fetch('/questions/flashcards', {
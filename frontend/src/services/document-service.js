@@ -1,6 +1,8 @@
 // Document service for managing documents
 const documentService = {
     documents: [],
+    documentsById: new Map(),
+    processingCount: 0, // Number of documents with processing status, kept in sync with documents
     refreshInterval: null,
     
     // Initialize document service
@@ -18,9 +20,7 @@ const documentService = {
         
         // Check for documents with processing status every 5 seconds
         this.refreshInterval = setInterval(async () => {
-            const hasProcessingDocuments = this.documents.some(doc => doc.status === 'processing');
-            
-            if (hasProcessingDocuments) {
+            if (this.processingCount > 0) {
                 await this.refreshDocuments();
                 documentList.updateDocumentList(this.documents);
             }
@@ -41,6 +41,10 @@ const documentService = {
         
         // Add to local documents and refresh UI
         this.documents.push(document);
+        this.documentsById.set(document.id, document);
+        if (document.status === 'processing') {
+            this.processingCount++;
+        }
         documentList.updateDocumentList(this.documents);
         
         return document;
@@ -54,7 +58,7 @@ const documentService = {
     
     // Get a single document by ID
     getDocument(documentId) {
-        return this.documents.find(doc => doc.id === documentId);
+        return this.documentsById.get(documentId);
     },
     
     // Refresh documents from API
@@ -62,6 +66,16 @@ const documentService = {
         try {
             const response = await api.getDocuments();
             this.documents = response.documents || [];
+            
+            // Index the documents once per refresh instead of scanning them on every lookup and tick
+            this.documentsById = new Map();
+            this.processingCount = 0;
+            for (const doc of this.documents) {
+                this.documentsById.set(doc.id, doc);
+                if (doc.status === 'processing') {
+                    this.processingCount++;
+                }
+            }
             return this.documents;
         } catch (error) {
             console.error('Error refreshing documents:', error);
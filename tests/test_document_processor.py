@@ -0,0 +1,41 @@
+import numpy as np
+
+from app.core.document_processor import chunk_text
+
+MAX_CHUNK_SIZE = 2000
+OVERLAP = 200
+
+def synthetic_text(seed: int, sentences: int = 3000) -> str:
+    """Sentences of varying length, with paragraph breaks and the odd run of unbroken text."""
+    rng = np.random.default_rng(seed)
+    parts = []
+    for i in range(sentences):
+        words = rng.integers(3, 40)
+        parts.append(" ".join(f"w{rng.integers(1000)}" for _ in range(words)) + rng.choice([". ", "! ", "? "]))
+        if i % 25 == 24:
+            parts.append("\n\n")
+        if i % 500 == 499:
+            parts.append("x" * 3000)
+    return "".join(parts)
+
+def test_short_text_is_one_chunk():
+    assert chunk_text("A short page. ") == ["A short page. "]
+
+def test_chunks_cover_the_text_with_overlap():
+    for seed in range(3):
+        text = synthetic_text(seed)
+        chunks = chunk_text(text, MAX_CHUNK_SIZE, OVERLAP)
+        
+        # Each chunk starts with the last OVERLAP characters of the previous one
+        for previous, chunk in zip(chunks, chunks[1:]):
+            assert chunk[:OVERLAP] == previous[-OVERLAP:]
+        assert chunks[0] + "".join(chunk[OVERLAP:] for chunk in chunks[1:]) == text
+
+def test_chunk_sizes():
+    text = synthetic_text(4)
+    chunks = chunk_text(text, MAX_CHUNK_SIZE, OVERLAP)
+    
+    # Boundaries in the first half of the window are skipped, so no chunk but the last is small
+    assert all(MAX_CHUNK_SIZE // 2 <= len(chunk) <= MAX_CHUNK_SIZE for chunk in chunks[:-1])
+    # The tail is merged into the last chunk rather than left as a chunk of little more than the overlap
+    assert OVERLAP < len(chunks[-1]) <= MAX_CHUNK_SIZE + OVERLAP
@@ -0,0 +1,163 @@
+import hashlib
+import sqlite3
+
+import numpy as np
+import pytest
+
+from app.db import vector_store
+from app.db.vector_store import ChunkMetadata, EmbeddingVectorStore, SimpleDictVectorStore, quantize_int8
+
+DIM = 32
+WORDS = [f"word{i}" for i in range(60)]
+
+def fake_encode(texts, model_name=None):
+    """Normalized bag-of-words embeddings, so the tests don't need a model."""
+    vectors = np.zeros((len(texts), DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for term in text.lower().split():
+            vectors[row, int(hashlib.md5(term.encode()).hexdigest(), 16) % DIM] += 1.0
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+def make_chunks(rng, count, document_ids, start=0):
+    return [
+        {
+            "id": f"chunk{i}",
+            "document_id": document_ids[i % len(document_ids)],
+            "content": " ".join(rng.choice(WORDS, size=8)),
+            "page_number": i % 5 + 1,
+            "chunk_index": i,
+            "metadata": {"source": "test"}
+        }
+        for i in range(start, start + count)
+    ]
+
+@pytest.fixture
+def open_store(monkeypatch, tmp_path):
+    """Open EmbeddingVectorStores persisted to one temporary directory."""
+    monkeypatch.setattr(vector_store, "check_embedding_backend", lambda model_name: None)
+    monkeypatch.setattr(vector_store, "encode_texts", fake_encode)
+    monkeypatch.setattr(vector_store, "select_torch_device", lambda: None)
+    stores = []
+    
+    def open_():
+        store = EmbeddingVectorStore(persist_directory=str(tmp_path / "embeddings"))
+        stores.append(store)
+        return store
+    
+    yield open_
+    for store in stores:
+        store._db.close()
+
+def test_quantize_int8_round_trip():
+    vectors = np.random.default_rng(0).standard_normal((50, DIM)).astype(np.float32)
+    vectors[3] = 0.0
+    quantized, scales = quantize_int8(vectors)
+    
+    assert quantized.dtype == np.int8 and scales.dtype == np.float32
+    restored = quantized.astype(np.float32) * scales[:, None]
+    # Rounding to the nearest step is off by at most half a step
+    assert np.all(np.abs(restored - vectors) <= scales[:, None] / 2 + 1e-6)
+    # The largest magnitude of each non-zero row maps to +-127
+    assert np.all(np.abs(quantized[np.arange(50) != 3]).max(axis=1) == 127)
+    assert not quantized[3].any() and np.isfinite(scales[3])
+
+def test_rows_of_respects_row_snapshot():
+    metadata = ChunkMetadata()
+    for row in range(10):
+        metadata.append("a" if row % 3 else "b", row, row, {})
+    
+    assert metadata.rows_of("a", 10).tolist() == [1, 2, 4, 5, 7, 8]
+    assert metadata.rows_of("a", 5).tolist() == [1, 2, 4]
+    assert metadata.rows_of("b", 0).tolist() == []
+    assert metadata.rows_of("missing", 10).tolist() == []
+    
+    # Rows appended after a search took its snapshot stay invisible to it
+    metadata.append("a", 10, 10, {})
+    assert metadata.rows_of("a", 10).tolist() == [1, 2, 4, 5, 7, 8]
+    assert metadata.rows_of("a", 11).tolist()[-1] == 10
+    assert metadata.rows_of("a", 11).dtype == np.int32
+
+def test_bloom_filtered_counts_match_plain_counts():
+    rng = np.random.default_rng(1)
+    store = SimpleDictVectorStore()
+    assert store.add_chunks(make_chunks(rng, 400, ["small", "large", "large", "large"]))
+    num_rows = len(store.chunk_ids)
+    
+    for _ in range(30):
+        terms = [term for term in set(rng.choice(WORDS, size=4)) if term in store.postings]
+        plain = np.bincount(
+            np.concatenate([store._posting_array(term) for term in terms]), minlength=num_rows
+        )[:num_rows]
+        for doc_id in ("small", "large"):
+            candidates = store.metadata.rows_of(doc_id, num_rows)
+            filtered = store._filtered_counts(terms, candidates, num_rows)
+            assert np.array_equal(filtered[candidates], plain[candidates])
+            assert not np.delete(filtered, candidates).any()
+
+def test_embedding_store_reloads_persisted_rows(open_store):
+    rng = np.random.default_rng(2)
+    store = open_store()
+    assert store.add_chunks(make_chunks(rng, 120, ["a", "b"]))
+    expected = store.search("word1 word2 word3", limit=5)
+    embeddings, scales = np.array(store.emb_i8[:store.n]), np.array(store.scales[:store.n])
+    
+    reloaded = open_store()
+    assert reloaded.n == 120
+    assert reloaded.chunk_ids == store.chunk_ids
+    assert np.array_equal(reloaded.emb_i8[:reloaded.n], embeddings)
+    assert np.array_equal(reloaded.scales[:reloaded.n], scales)
+    assert [reloaded.metadata.get(row) for row in range(120)] == [store.metadata.get(row) for row in range(120)]
+    assert all("document_id" not in extra for extra in reloaded.metadata.extra)
+    assert reloaded.search("word1 word2 word3", limit=5) == expected
+    assert reloaded.search("word1", {"document_id": "b"}, limit=3)[0]["metadata"]["document_id"] == "b"
+    
+    # Known IDs are skipped, new rows are appended after the persisted ones
+    assert reloaded.add_chunks(make_chunks(rng, 10, ["a"], start=115))
+    assert reloaded.n == 125
+    assert open_store().chunk_ids == reloaded.chunk_ids
+
+def test_remove_documents_except_compacts_persisted_rows(open_store):
+    rng = np.random.default_rng(3)
+    store = open_store()
+    store.add_chunks(make_chunks(rng, 90, ["keep", "drop", "drop"]))
+    kept_ids = [chunk_id for row, chunk_id in enumerate(store.chunk_ids) if store.metadata.get(row)["document_id"] == "keep"]
+    
+    assert store.remove_documents_except({"keep"}) == 60
+    assert store.chunk_ids == kept_ids
+    assert store.metadata.rows_of("drop", store.n).tolist() == []
+    assert {result["metadata"]["document_id"] for result in store.search("word1 word2", limit=10)} == {"keep"}
+    
+    reloaded = open_store()
+    assert reloaded.chunk_ids == kept_ids
+    assert np.array_equal(reloaded.emb_i8[:reloaded.n], store.emb_i8[:store.n])
+
+def test_failed_persist_publishes_no_rows(open_store, monkeypatch):
+    rng = np.random.default_rng(4)
+    store = open_store()
+    store.add_chunks(make_chunks(rng, 5, ["a"]))
+    
+    def fail(first_row, chunks):
+        raise sqlite3.OperationalError("disk full")
+    
+    with monkeypatch.context() as patch:
+        patch.setattr(store, "_persist", fail)
+        assert not store.add_chunks(make_chunks(rng, 3, ["a"], start=5))
+    assert store.n == 5 and "chunk5" not in store.documents
+    
+    # The next batch takes the rows the failed one left unpublished, so a reload lines up
+    assert store.add_chunks(make_chunks(rng, 3, ["a"], start=8))
+    reloaded = open_store()
+    assert reloaded.chunk_ids == store.chunk_ids
+    assert np.array_equal(reloaded.emb_i8[:reloaded.n], store.emb_i8[:store.n])
+
+def test_keyword_search_matches_non_ascii_terms():
+    store = SimpleDictVectorStore()
+    store.add_chunks([
+        {"id": "de", "document_id": "a", "content": "Die Schrödinger-Gleichung", "metadata": {}},
+        {"id": "el", "document_id": "a", "content": "Η συνάρτηση κύματος", "metadata": {}},
+        {"id": "en", "document_id": "a", "content": "The wave function", "metadata": {}}
+    ])
+    
+    assert [result["id"] for result in store.search("schrödinger")] == ["de"]
+    assert [result["id"] for result in store.search("ΚΎΜΑΤΟΣ")] == ["el"]